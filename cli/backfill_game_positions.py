@@ -0,0 +1,57 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from sqlalchemy import inspect, text
+
+from cli.helper import create_app
+from recLeague import db
+from recLeague.models import player_game_table, team_game_table
+
+TABLES = [player_game_table, team_game_table]
+
+
+def add_missing_columns():
+    for table in TABLES:
+        columns = [
+            c["name"] for c in inspect(db.engine).get_columns(table.name)
+        ]
+
+        if "position" not in columns:
+            print(f"Adding column position to {table.name}")
+            db.session.execute(text(
+                f"ALTER TABLE {table.name} ADD COLUMN position "
+                "INTEGER NOT NULL DEFAULT 0"
+            ))
+    db.session.commit()
+
+
+def backfill_positions(table):
+    # Rows were inserted in the order of the game's teams and players, so
+    # games that never had positions set are numbered by rowid
+    result = db.session.execute(text(
+        f"UPDATE {table.name} SET position = ordered.position "
+        "FROM ("
+        "  SELECT rowid AS row_id, row_number() OVER ("
+        "    PARTITION BY game_id ORDER BY rowid"
+        "  ) - 1 AS position "
+        f"  FROM {table.name} "
+        "  WHERE game_id IN ("
+        f"    SELECT game_id FROM {table.name} GROUP BY game_id "
+        "    HAVING max(position) = 0 AND count(*) > 1"
+        "  )"
+        ") AS ordered "
+        f"WHERE {table.name}.rowid = ordered.row_id"
+    ))
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    app = create_app()
+    app.app_context().push()
+
+    add_missing_columns()
+    for table in TABLES:
+        count = backfill_positions(table)
+        print(f"Backfilled {count} positions in {table.name}")
+    db.session.commit()
@@ -0,0 +1,42 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from sqlalchemy import inspect, text
+
+from cli.helper import create_app
+from recLeague import db
+from recLeague.models import Team
+
+
+def add_missing_columns():
+    columns = [c["name"] for c in inspect(db.engine).get_columns("team")]
+
+    if "games_played" not in columns:
+        print("Adding column games_played")
+        db.session.execute(text(
+            "ALTER TABLE team ADD COLUMN games_played "
+            "INTEGER NOT NULL DEFAULT 0"
+        ))
+
+
+def backfill_games_played():
+    # Every verified game a team played is either a win or a loss
+    result = db.session.execute(
+        db.update(Team)
+        .where(Team.games_played != Team.wins + Team.losses)
+        .values(games_played=Team.wins + Team.losses)
+        .execution_options(synchronize_session=False)
+    )
+    return result.rowcount
+
+
+if __name__ == "__main__":
+    app = create_app()
+    app.app_context().push()
+
+    add_missing_columns()
+    count = backfill_games_played()
+    db.session.commit()
+
+    print(f"Backfilled games played of {count} teams")
@@ -0,0 +1,32 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from sqlalchemy import inspect, text
+
+from cli.helper import create_app
+from recLeague import db
+from recLeague.users.utils import recount_medals
+
+
+def add_missing_columns():
+    columns = [c["name"] for c in inspect(db.engine).get_columns("user")]
+
+    for name in ["championship_count", "runner_up_count"]:
+        if name not in columns:
+            print(f"Adding column {name}")
+            db.session.execute(text(
+                f"ALTER TABLE user ADD COLUMN {name} "
+                "INTEGER NOT NULL DEFAULT 0"
+            ))
+
+
+if __name__ == "__main__":
+    app = create_app()
+    app.app_context().push()
+
+    add_missing_columns()
+    recount_medals()
+    db.session.commit()
+
+    print("Backfilled championship and runner-up counts")
@@ -0,0 +1,56 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from sqlalchemy import inspect, text
+
+from cli.helper import create_app
+from recLeague import db
+from recLeague.models import Game
+from recLeague.games.scorecards import scorecards, process_scorecard
+
+
+def add_missing_columns():
+    columns = [c["name"] for c in inspect(db.engine).get_columns("game")]
+
+    if "picture_manifest" not in columns:
+        print("Adding column picture_manifest")
+        db.session.execute(text(
+            "ALTER TABLE game ADD COLUMN picture_manifest JSON"
+        ))
+        db.session.commit()
+
+
+def backfill_derivatives():
+    games = Game.query.filter(
+        Game.picture_file.isnot(None), Game.picture_manifest.is_(None)
+    ).all()
+
+    done = 0
+    for game in games:
+        path = scorecards.picture_path(game.picture_file)
+        if os.path.isfile(path) is False:
+            print(f"Skipping game {game.id}, missing {path}")
+            continue
+
+        game.picture_manifest = process_scorecard(
+            path, scorecards.shard_dir(game.picture_file), game.picture_file
+        )
+        done += 1
+        # Commit as we go so an interrupted backfill can be resumed
+        if done % 50 == 0:
+            db.session.commit()
+            print(f"Backfilled {done}/{len(games)} scorecards")
+
+    db.session.commit()
+    return done
+
+
+if __name__ == "__main__":
+    app = create_app()
+    app.app_context().push()
+
+    add_missing_columns()
+    done = backfill_derivatives()
+
+    print(f"Backfilled derivatives of {done} scorecard pictures")
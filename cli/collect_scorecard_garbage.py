@@ -0,0 +1,29 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from cli.helper import create_app
+from recLeague import db
+from recLeague.models import Game
+from recLeague.games.scorecards import scorecards
+
+
+def get_max_shards():
+    # Number of shards to scan is given with --shards, e.g. --shards 16
+    if "--shards" in sys.argv:
+        return int(sys.argv[sys.argv.index("--shards") + 1])
+
+    return None
+
+
+if __name__ == "__main__":
+    app = create_app()
+    app.app_context().push()
+
+    # Reference counts are looked up by picture file
+    for index in Game.__table__.indexes:
+        index.create(db.engine, checkfirst=True)
+
+    removed = scorecards.collect_garbage(get_max_shards())
+
+    print(f"Removed {removed} unreferenced scorecard files")
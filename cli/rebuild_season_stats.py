@@ -0,0 +1,58 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+import time
+
+from cli.helper import create_app, get_answer
+from recLeague import db
+from recLeague.games.utils import (
+    calculate_team_stats, rebuild_player_stats, calculate_head_to_head
+)
+from recLeague.admin.utils import rebuild_previous_season_stats
+from recLeague.stats.utils import refresh_leaderboard
+
+
+def rebuild_season_stats():
+    app = create_app()
+    app.app_context().push()
+
+    start = time.perf_counter()
+
+    # Create any tables and indexes added since the database was initialized
+    db.create_all()
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+    print("Rebuilding team records")
+    calculate_team_stats()
+
+    print("Rebuilding player stats")
+    num_lines = rebuild_player_stats()
+
+    print("Rebuilding head-to-head records")
+    calculate_head_to_head()
+
+    print("Rebuilding previous season stats")
+    if not rebuild_previous_season_stats():
+        print("Kept previous season stats, some archived seasons have no "
+              "season player stats")
+
+    print("Rebuilding leaderboard")
+    refresh_leaderboard()
+
+    db.session.commit()
+    print(f"Rebuilt season stats from {num_lines} game stat lines in "
+          f"{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    prompt = ("Rebuild all current season team records, player stats and "
+              "head-to-head records from the verified games, and previous "
+              "season stats from the archived seasons?")
+
+    if get_answer(prompt) is False:
+        print("Canceling rebuild")
+        sys.exit()
+
+    rebuild_season_stats()
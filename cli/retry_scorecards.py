@@ -0,0 +1,23 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from cli.helper import create_app
+from recLeague.games.scorecards import scorecards
+
+
+if __name__ == "__main__":
+    app = create_app()
+    app.app_context().push()
+
+    failed = scorecards.failed_pictures()
+    for picture_file in failed:
+        print(f"Failed to process {picture_file}")
+
+    # Failed pictures are only listed unless --retry is given
+    if "--retry" in sys.argv:
+        retried = scorecards.retry_failed()
+        print(f"Queued {retried} scorecard pictures again")
+    else:
+        print(f"{len(failed)} scorecard pictures failed to process, run "
+              "with --retry to process them again")
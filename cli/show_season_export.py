@@ -0,0 +1,54 @@
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+
+from cli.helper import create_app
+from recLeague.admin.archive import archiver
+from recLeague.admin.season_export import SeasonExport
+from recLeague.stats.utils import STAT_COLUMNS
+
+
+def get_option(name):
+    # Options are given as --name value, e.g. --player 12
+    if name in sys.argv:
+        return int(sys.argv[sys.argv.index(name) + 1])
+
+    return None
+
+
+if __name__ == "__main__":
+    if len(sys.argv) < 2:
+        print("Usage: python cli/show_season_export.py ARCHIVED_SEASON_ID "
+              "[--player USER_ID] [--team TEAM_ID]")
+        sys.exit(1)
+
+    app = create_app()
+    app.app_context().push()
+
+    archived_season_id = int(sys.argv[1])
+    export = SeasonExport.open(archived_season_id, archiver.export_dir)
+    if export is None:
+        print(f"Archived season {archived_season_id} was not exported")
+        sys.exit(1)
+
+    with export:
+        manifest = export.manifest
+        print(f"{manifest['name']} ({manifest['date_start'][:10]} to "
+              f"{manifest['date_end'][:10]}): {len(export['game_id'])} games, "
+              f"{len(export['line_player_id'])} stat lines, "
+              f"{len(manifest['teams'])} teams")
+
+        player_id = get_option("--player")
+        if player_id is not None:
+            agg = export.player_stats(player_id)
+            print(f"Player {player_id}")
+            print(f"  {'Stat':<16}{'Total':>8}{'Best':>8}")
+            for i, key in enumerate(STAT_COLUMNS):
+                print(f"  {key:<16}{agg.sums[i]:>8}{agg.maxima[i]:>8}")
+
+        team_id = get_option("--team")
+        if team_id is not None:
+            names = {t["id"]: t["name"] for t in manifest["teams"]}
+            print(f"Team {names.get(team_id, team_id)}: players "
+                  f"{export.roster(team_id).tolist()}, games "
+                  f"{export.team_games(team_id).tolist()}")
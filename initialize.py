@@ -1,13 +1,12 @@
 import sys
-import os
 import secrets
 
 from cli.helper import (
     create_app, database_exists, get_answer
 )
 from recLeague import db, bcrypt
-from recLeague.config import SCORECARD_PICS_PATH
 from recLeague.models import Settings, User
+from recLeague.games.scorecards import scorecards
 
 
 # Clear any existing database and create a new database
@@ -61,11 +60,6 @@ for i in range(2):
 db.session.commit()
 
 # Clear photos
-path = SCORECARD_PICS_PATH
-if os.path.isdir(path):
-    for f in os.listdir(path):
-        os.remove(os.path.join(path, f))
-else:
-    os.makedirs(path)
+scorecards.clear()
 
 print("App initialized")
@@ -0,0 +1,136 @@
+""" Benchmarks the /auth fast path against the full Flask request.
+
+Builds a temporary SQLite database with a normal, a banned and a deleted
+user, checks both ways of answering /auth agree for every kind of cookie,
+then times each way.
+
+Usage:
+
+    python mock/bench_auth.py [num_checks]
+"""
+
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+import tempfile
+import time
+
+from flask_login.utils import encode_cookie
+from werkzeug.test import EnvironBuilder, run_wsgi_app
+
+import recLeague
+from recLeague import db
+from recLeague.models import User
+
+
+def create_users():
+    db.session.add(User(
+        name="League Admin", email="admin", password="-", is_admin=True
+    ))
+    db.session.add(User(name="Robot 1", email="robot1@bench", password="-"))
+    db.session.add(User(
+        name="Robot 2", email="robot2@bench", password="-", is_banned=True
+    ))
+    deleted = User(name="Robot 3", email="robot3@bench", password="-")
+    db.session.add(deleted)
+    db.session.commit()
+
+    db.session.delete(deleted)
+    db.session.commit()
+
+
+def add_user():
+    # Signs up after the fast path cached the users
+    db.session.add(User(name="Robot 5", email="robot5@bench", password="-"))
+    db.session.commit()
+
+
+def session_cookie(app, values):
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session.update(values)
+
+    return client.get_cookie(app.config["SESSION_COOKIE_NAME"]).value
+
+
+def build_environ(cookies):
+    header = "; ".join(f"{k}={v}" for k, v in cookies.items())
+    builder = EnvironBuilder(path="/auth", headers={"Cookie": header})
+    return builder.get_environ()
+
+
+def check(wsgi_app, environ):
+    app_iter, status, headers = run_wsgi_app(wsgi_app, dict(environ))
+    for _ in app_iter:
+        pass
+    if hasattr(app_iter, "close"):
+        app_iter.close()
+
+    return int(status.split()[0])
+
+
+def time_checks(wsgi_app, environ, num_checks):
+    start = time.perf_counter()
+    for _ in range(num_checks):
+        check(wsgi_app, environ)
+
+    return num_checks / (time.perf_counter() - start)
+
+
+if __name__ == "__main__":
+    num_checks = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+
+    # Use a temporary database so the league database is never touched
+    tmp_dir = tempfile.mkdtemp()
+    recLeague.SQLALCHEMY_DATABASE_URI = (
+        "sqlite:///" + os.path.join(tmp_dir, "bench.db")
+    )
+    app = recLeague.create_app()
+    with app.app_context():
+        db.create_all()
+        create_users()
+        remember = encode_cookie("2")
+
+    session_name = app.config["SESSION_COOKIE_NAME"]
+    remember_name = app.config.get("REMEMBER_COOKIE_NAME", "remember_token")
+    logged_in = {"_user_id": "2", "_fresh": True}
+    banned = {"_user_id": "3", "_fresh": True}
+    deleted = {"_user_id": "4", "_fresh": True}
+    new = {"_user_id": "5", "_fresh": True}
+    cases = {
+        "Session": ({session_name: session_cookie(app, logged_in)}, 200),
+        "Remember cookie": ({remember_name: remember}, 200),
+        "Banned user": ({session_name: session_cookie(app, banned)}, 401),
+        "Deleted user": ({session_name: session_cookie(app, deleted)}, 401),
+        "New user": ({session_name: session_cookie(app, new)}, 200),
+        "Tampered session": (
+            {session_name: session_cookie(app, logged_in)[:-2] + "xx"}, 401
+        ),
+        # Logging out clears the remember cookie on the next response
+        "Logged out": ({
+            session_name: session_cookie(app, {"_remember": "clear"}), 
+            remember_name: remember
+        }, 401),
+        "No cookie": ({}, 401),
+    }
+
+    fast_path = app.wsgi_app
+    flask_app = app.wsgi_app.wsgi_app
+
+    print(f"{'Case':<20}{'Fast path':>14}{'Flask':>14}")
+    for name, (cookies, expected) in cases.items():
+        if name == "New user":
+            with app.app_context():
+                add_user()
+
+        environ = build_environ(cookies)
+        assert check(fast_path, environ) == expected, f"Fast path {name}"
+        assert check(flask_app, environ) == expected, f"Flask {name}"
+
+        fast_rate = time_checks(fast_path, environ, num_checks)
+        flask_rate = time_checks(flask_app, environ, num_checks // 10)
+        print(f"{name:<20}{fast_rate:>12.0f}/s{flask_rate:>12.0f}/s")
+
+        assert fast_rate > 1000, f"Fast path too slow for {name}"
+
+    print("Fast path and Flask agree on every case")
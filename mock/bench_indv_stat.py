@@ -0,0 +1,136 @@
+""" Benchmarks the User.indv_stat subquery against the IndvStatJoin query.
+
+Builds a temporary SQLite database with generated users and stats, then
+times the leaderboard query of every board stat period with both forms and
+checks they return the same ranking.
+
+Usage:
+
+    python mock/bench_indv_stat.py [num_users]
+"""
+
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+import random
+import tempfile
+import time
+
+import recLeague
+from recLeague import db
+from recLeague.models import User, Stats, IndvStatJoin
+from recLeague.stats.utils import board_stats, STAT_COLUMNS
+
+periods = ["season_stats", "season_high_stats", "prev_season_stats",
+           "prev_season_best_stats", "prev_season_high_stats"]
+
+
+def create_users(num_users):
+    stat_rows = []
+    user_rows = []
+    for i in range(num_users):
+        user = {
+            "id": i + 1, "name": f"Robot {i+1}", "email": f"{i+1}@bench",
+            "password": "-", "is_admin": False, "is_banned": False
+        }
+        for period in periods:
+            # Leave some periods empty like new players
+            if random.random() < 0.2:
+                user[period + "_id"] = None
+                continue
+
+            stats = {k: random.randrange(50) for k in STAT_COLUMNS}
+            stats["id"] = len(stat_rows) + 1
+            stats["game_count"] = random.randrange(12)
+            stat_rows.append(stats)
+            user[period + "_id"] = stats["id"]
+        user_rows.append(user)
+
+    db.session.execute(db.insert(Stats), stat_rows)
+    db.session.execute(db.insert(User), user_rows)
+    db.session.commit()
+
+
+def subquery_leaderboard(stat_key, board_stat):
+    params = [
+        stat_key, board_stat["period_1"], board_stat.get("period_2"),
+        board_stat.get("combine_max", False),
+        board_stat.get("div_by_games", False)
+    ]
+    stat = User.indv_stat(*params)
+
+    return db.session.execute(
+        db.select(User.id, stat)
+        .where(User.id != 1, User.name != "Guest Player",
+               User.indv_stat("game_count", *params[1:3])
+               >= board_stat.get("min_games", 1))
+        .order_by(stat.desc(), User.id)
+    ).all()
+
+
+def join_leaderboard(stat_key, board_stat):
+    stats = IndvStatJoin(board_stat["period_1"], board_stat.get("period_2"))
+    stat = stats.stat(
+        stat_key, board_stat.get("combine_max", False),
+        board_stat.get("div_by_games", False)
+    )
+
+    return stats.join(db.session.query(User.id, stat)) \
+        .filter(User.id != 1, User.name != "Guest Player",
+                stats.stat("game_count") >= board_stat.get("min_games", 1)) \
+        .order_by(stat.desc(), User.id).all()
+
+
+def time_query(func, *args, repeat=3):
+    best = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        rows = func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+
+    return rows, best
+
+
+if __name__ == "__main__":
+    num_users = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+
+    # Use a temporary database so the league database is never touched
+    tmp_dir = tempfile.mkdtemp()
+    recLeague.SQLALCHEMY_DATABASE_URI = (
+        "sqlite:///" + os.path.join(tmp_dir, "bench.db")
+    )
+    app = recLeague.create_app()
+    app.app_context().push()
+    db.create_all()
+
+    random.seed(0)
+    print(f"Creating {num_users} users")
+    create_users(num_users)
+
+    print(f"{'Period':<24}{'Stat':<12}{'Subquery':>10}{'Join':>10}")
+    total_sub = 0.0
+    total_join = 0.0
+    for period, board_stat in board_stats.items():
+        for stat_key in STAT_COLUMNS:
+            sub_rows, sub_time = time_query(
+                subquery_leaderboard, stat_key, board_stat
+            )
+            join_rows, join_time = time_query(
+                join_leaderboard, stat_key, board_stat
+            )
+
+            sub_rows = [(i, None if v is None else round(v, 9))
+                        for i, v in sub_rows]
+            join_rows = [(i, None if v is None else round(v, 9))
+                         for i, v in join_rows]
+            assert sub_rows == join_rows, f"Mismatch for {period} {stat_key}"
+
+            total_sub += sub_time
+            total_join += join_time
+            print(f"{period:<24}{stat_key:<12}"
+                  f"{sub_time * 1000:>8.1f}ms{join_time * 1000:>8.1f}ms")
+
+    print(f"{'Total':<36}{total_sub * 1000:>8.1f}ms"
+          f"{total_join * 1000:>8.1f}ms")
+    print("Both query forms returned identical results")
@@ -0,0 +1,156 @@
+""" Checks the game card pages run a constant number of queries.
+
+Builds a temporary SQLite database, then renders every page showing game
+cards while adding games. The number of queries for each page must stay the
+same no matter how many games it shows.
+
+Usage:
+
+    python mock/check_game_card_queries.py
+"""
+
+import sys
+import os
+sys.path[0] = os.path.join(sys.path[0], "..")
+import random
+import tempfile
+from datetime import datetime, timedelta
+
+from sqlalchemy import event
+
+import recLeague
+from recLeague import db
+from recLeague.models import (
+    User, Team, Division, Season, ArchivedSeason, Game, Stats,
+    team_game_table, player_game_table
+)
+from recLeague.config import NUM_TEAM_PLAYERS, STAT_CATEGORY_KEYS
+
+num_teams = 6
+game_counts = [1, 10, 25]
+
+
+def create_league():
+    db.session.add(User(
+        name="League Admin", email="admin", password="-", is_admin=True
+    ))
+    db.session.add(Season(
+        name="Generated Season", date_start=datetime.today(),
+        date_end=(datetime.today() + timedelta(days=1))
+    ))
+    divisions = [Division(name="Division 1"), Division(name="Division 2")]
+
+    for i in range(num_teams):
+        team = Team(name=f"Team {i+1}", division=divisions[i % 2])
+        for p in range(NUM_TEAM_PLAYERS):
+            db.session.add(User(
+                name=f"Robot {i+1}-{p+1}", email=f"robot{i+1}-{p+1}@bench",
+                password="-", team=team
+            ))
+
+    # Give players trophies to show in display names
+    teams = Team.query.all()
+    db.session.add(ArchivedSeason(
+        name="Old Season", date_start=datetime.today(),
+        date_end=datetime.today(), num_games=0, num_teams=0,
+        num_divisions=0, champion_team_name="-", runner_up_team_name="-",
+        champions=teams[0].players, runner_ups=teams[1].players
+    ))
+    for p in teams[0].players:
+        p.championship_count = 1
+    for p in teams[1].players:
+        p.runner_up_count = 1
+    db.session.commit()
+
+
+def create_games(num_games):
+    teams = Team.query.all()
+    created = Game.query.count()
+
+    # Rotate teams so the first team plays in the first game
+    for n in range(created, created + num_games):
+        team_1 = teams[n % num_teams]
+        team_2 = teams[(n + 1) % num_teams]
+        game = Game(
+            team_1_score=random.randrange(6),
+            team_2_score=random.randrange(6),
+            is_sub=[False] * (NUM_TEAM_PLAYERS * 2),
+            comment="Generated game"
+        )
+        for _ in range(NUM_TEAM_PLAYERS * 2):
+            stats = Stats()
+            stats.set_stats(
+                [random.randrange(5) for _ in STAT_CATEGORY_KEYS], 1
+            )
+            game.player_stats.append(stats)
+        db.session.add(game)
+        db.session.flush()
+
+        db.session.execute(db.insert(team_game_table), [
+            {"game_id": game.id, "team_id": t.id, "position": i}
+            for i, t in enumerate([team_1, team_2])
+        ])
+        db.session.execute(db.insert(player_game_table), [
+            {"game_id": game.id, "player_id": p.id, "position": i}
+            for i, p in enumerate(team_1.players + team_2.players)
+        ])
+
+    db.session.commit()
+
+
+if __name__ == "__main__":
+    # Use a temporary database so the league database is never touched
+    tmp_dir = tempfile.mkdtemp()
+    recLeague.SQLALCHEMY_DATABASE_URI = (
+        "sqlite:///" + os.path.join(tmp_dir, "queries.db")
+    )
+    app = recLeague.create_app()
+
+    random.seed(0)
+    with app.app_context():
+        db.create_all()
+        create_league()
+
+        team = Team.query.first()
+        pages = [
+            "/home", f"/user/{team.players[0].id}", f"/team/{team.id}",
+            "/admin/games?cat=All"
+        ]
+
+        query_count = 0
+
+        @event.listens_for(db.engine, "before_cursor_execute")
+        def count_query(*args):
+            global query_count
+            query_count += 1
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["_user_id"] = "1"
+        session["_fresh"] = True
+
+    counts = {page: [] for page in pages}
+    created = 0
+    for num_games in game_counts:
+        with app.app_context():
+            create_games(num_games - created)
+        created = num_games
+
+        for page in pages:
+            # Warm the per-process caches so only page queries are counted
+            client.get(page)
+
+            query_count = 0
+            response = client.get(page)
+            assert response.status_code == 200, f"{page} returned \
+                {response.status_code}"
+            counts[page].append(query_count)
+
+    print(f"{'Page':<24}" + "".join(f"{n:>6}" for n in game_counts))
+    for page, page_counts in counts.items():
+        print(f"{page:<24}" + "".join(f"{n:>6}" for n in page_counts))
+
+    for page, page_counts in counts.items():
+        assert len(set(page_counts)) == 1, f"Query count of {page} grows \
+            with the number of games"
+    print("Query counts are constant")
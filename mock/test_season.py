@@ -2,7 +2,7 @@ from recLeague import db
 from recLeague.models import User, Game, Team, Division, Season, Stats
 from recLeague import create_app
 from recLeague.config import TestConfig
-from recLeague.games.routes import calculate_stats
+from recLeague.games.utils import calculate_stats
 import random
 from datetime import datetime, timedelta
 
@@ -6,6 +6,7 @@ from flask_bcrypt import Bcrypt
 from flask_login import LoginManager
 from flask_wtf.csrf import CSRFProtect
 from flask_mail import Mail
+from sqlalchemy import event
 
 from recLeague.config import (
     FlaskConfig,
@@ -53,11 +54,35 @@ def create_app() -> Flask:
     print(f"Using database: {SQLALCHEMY_DATABASE_URI}")
 
     db.init_app(app)
+
+    # Readers don't wait for a long write, like archiving the season
+    journal_mode = app.config.get("SQLITE_JOURNAL_MODE")
+    if journal_mode is not None \
+            and SQLALCHEMY_DATABASE_URI.startswith("sqlite"):
+        with app.app_context():
+            @event.listens_for(db.engine, "connect")
+            def set_journal_mode(dbapi_connection, connection_record):
+                dbapi_connection.execute(f"PRAGMA journal_mode={journal_mode}")
+
     bcrypt.init_app(app)
     login_manager.init_app(app)
     csrf.init_app(app)
     mail.init_app(app)
-    
+
+    from recLeague.cache import cache
+    from recLeague.users.utils import user_cache, allowed_cache
+    from recLeague.main.utils import season_cache
+    cache.init_app(app)
+    user_cache.ttl = app.config["USER_CACHE_TTL"]
+    allowed_cache.ttl = app.config["USER_CACHE_TTL"]
+    season_cache.ttl = app.config["SEASON_CACHE_TTL"]
+
+    from recLeague.games.scorecards import scorecards
+    scorecards.init_app(app)
+
+    from recLeague.admin.archive import archiver
+    archiver.init_app(app)
+
     from recLeague.users.routes import users
     from recLeague.games.routes import games
     from recLeague.teams.routes import teams
@@ -74,4 +99,8 @@ def create_app() -> Flask:
     app.register_blueprint(stats)
     # app.register_blueprint(errors)
 
+    # Answer NGINX auth subrequests before the rest of Flask
+    from recLeague.main.auth import AuthFastPath
+    app.wsgi_app = AuthFastPath(app, app.wsgi_app)
+
     return app
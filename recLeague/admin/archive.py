@@ -0,0 +1,366 @@
+""" Archiving the season in a background job.
+
+Archiving rolls over the stats of every user and recreates the season
+tables, which takes too long to do in a request. The admin starts a
+:py:class:`SeasonArchiveJob <recLeague.models.SeasonArchiveJob>` instead, and
+polls its status page while other requests are served.
+
+The job runs in :py:data:`PHASES`. A phase commits its changes together with
+the job moving on to the next phase, so the league is never left half
+archived. A job interrupted by a worker restart keeps its phase, and is
+resumed by the next worker claiming it once the previous worker's lease has
+expired.
+
+A phase holds the SQLite write lock until it commits. Pages, including the
+status page, are only served meanwhile if the database uses write-ahead
+logging, see ``SQLITE_JOURNAL_MODE``. Other writes wait for the phase to
+commit, so the slow leaderboard rebuild is its own phase, and it only takes
+the lock to write the rebuilt entries.
+"""
+
+from __future__ import annotations
+import logging
+import os
+import socket
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional
+
+from flask import Flask
+from sqlalchemy import or_
+
+from recLeague import db
+from recLeague.models import (
+    Team, Game, Division, Season, ArchivedSeason, SeasonArchiveJob
+)
+from recLeague.admin.utils import roll_over_season
+from recLeague.admin.season_export import export_season
+from recLeague.stats.utils import refresh_leaderboard
+from recLeague.main.utils import forget_current_season
+from recLeague.users.utils import forget_all_users
+from recLeague.games.scorecards import scorecards
+from recLeague.config import SCORECARD_PICS_INSTANCE_PATH
+
+PHASES = ("archive", "leaderboard", "pictures", "done")
+""" Phases of archiving a season, in order.
+
+* ``archive``: Creates the archived season with the stats of its players,
+  exports the raw season data to cold storage (see
+  :py:mod:`recLeague.admin.season_export`), rolls over the season stats and
+  recreates the season tables in one transaction.
+* ``leaderboard``: Rebuilds the leaderboard from the rolled over stats. Until
+  then the leaderboard shows the archived season.
+* ``pictures``: Removes the scorecard pictures of the season.
+* ``done``: The season has been archived.
+"""
+
+
+def create_archived_season(season: Season,
+                           job: SeasonArchiveJob) -> ArchivedSeason:
+    """Adds the archived season of the current season to the session, and
+    gives the players of the champion and runner-up teams their trophies.
+
+    Args:
+        season (Season): Current season.
+        job (SeasonArchiveJob): Job with the champion and runner-up teams,
+            and the summary of the season.
+
+    Returns:
+        ArchivedSeason: Archived season.
+    """
+
+    # Long way of counting teams with 2 players ... possibly in
+    # future try to make this a query
+    teams = Team.query.all()
+    team_count = 0
+    for t in teams:
+        if len(t.players) >= 2:
+            team_count += 1
+
+    arch_season = ArchivedSeason(
+        name=season.name, date_start=season.date_start,
+        date_end=season.date_end, num_games=Game.query.count(),
+        num_teams=team_count, num_divisions=Division.query.count()
+    )
+
+    if job.summary is not None:
+        arch_season.summary = job.summary
+
+    champion_team = db.session.get(Team, job.champion_team_id)
+    arch_season.champion_team_name = champion_team.name
+    for p in champion_team.players:
+        arch_season.champions.append(p)
+        p.championship_count += 1
+
+    runner_up_team = db.session.get(Team, job.runner_up_team_id)
+    arch_season.runner_up_team_name = runner_up_team.name
+    for p in runner_up_team.players:
+        arch_season.runner_ups.append(p)
+        p.runner_up_count += 1
+
+    db.session.add(arch_season)
+    return arch_season
+
+
+class SeasonArchiver:
+    """Runs season archive jobs on a background thread.
+
+    A worker claims a job by setting a lease on it, which is renewed after
+    every phase. Set the lease length in seconds with
+    ``SEASON_ARCHIVE_LEASE`` in the Flask config; it must be longer than the
+    slowest phase.
+    """
+
+    def __init__(self) -> None:
+        self.lease = 600
+        # Set by init_app, before any job runs
+        self.export_dir = ""
+        self._app: Optional[Flask] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._logger = logging.getLogger(__name__)
+        self._progress: dict[int, str] = {}
+
+    def init_app(self, app: Flask) -> None:
+        self._app = app
+        self._logger = app.logger
+        self.lease = app.config.get("SEASON_ARCHIVE_LEASE", 600)
+        self.export_dir = app.config.get("SEASON_EXPORT_DIR") \
+            or os.path.join(
+                app.instance_path, "season_exports",
+                os.path.basename(SCORECARD_PICS_INSTANCE_PATH)
+            )
+        self._executor = ThreadPoolExecutor(
+            1, thread_name_prefix="season-archive"
+        )
+
+    @property
+    def worker(self) -> str:
+        """Name of this worker process.
+        """
+        return f"{socket.gethostname()}:{os.getpid()}"
+
+    def unfinished_job(self) -> Optional[SeasonArchiveJob]:
+        """Gets the oldest job that has not finished archiving its season.
+
+        Returns:
+            Optional[SeasonArchiveJob]: Unfinished job, ``None`` if all jobs
+            are done.
+        """
+
+        return db.session.scalars(
+            db.select(SeasonArchiveJob)
+            .where(SeasonArchiveJob.phase != "done")
+            .order_by(SeasonArchiveJob.id)
+            .limit(1)
+        ).first()
+
+    def start(self, champion_team_id: Optional[int] = None,
+              runner_up_team_id: Optional[int] = None,
+              summary: Optional[str] = None) -> SeasonArchiveJob:
+        """Creates a job archiving the current season and starts it.
+
+        Args:
+            champion_team_id (Optional[int]): ID of the champion team. If
+                ``None`` the season is deleted without being archived.
+            runner_up_team_id (Optional[int]): ID of the runner-up team.
+            summary (Optional[str]): Summary of the season.
+
+        Returns:
+            SeasonArchiveJob: Created job.
+        """
+
+        job = SeasonArchiveJob(
+            champion_team_id=champion_team_id,
+            runner_up_team_id=runner_up_team_id,
+            summary=summary, message="Waiting to start"
+        )
+        db.session.add(job)
+        db.session.commit()
+
+        self.resume(job)
+        return job
+
+    def resume(self, job: SeasonArchiveJob) -> bool:
+        """Runs an unfinished job in the background, unless another worker
+        holds its lease or it failed.
+
+        Args:
+            job (SeasonArchiveJob): Job to resume.
+
+        Returns:
+            bool: ``True`` if this worker claimed the job.
+        """
+
+        if job.is_finished() or job.error is not None:
+            return False
+        if not self._claim(job.id):
+            return False
+
+        self._logger.info(f"Running season archive job {job.id} from phase "
+                          f"{job.phase}")
+        self._executor.submit(self._run, job.id)
+        return True
+
+    def retry(self, job: SeasonArchiveJob) -> bool:
+        """Clears the error of a failed job and resumes it.
+
+        Args:
+            job (SeasonArchiveJob): Failed job.
+
+        Returns:
+            bool: ``True`` if this worker claimed the job.
+        """
+
+        job.error = None
+        db.session.commit()
+        return self.resume(job)
+
+    def progress(self, job: SeasonArchiveJob) -> Optional[str]:
+        """Gets the latest progress message of a job.
+
+        Messages of a phase running on this worker are shown as they are
+        reported, other workers only show the message of the last finished
+        phase.
+
+        Args:
+            job (SeasonArchiveJob): Job to get the progress of.
+
+        Returns:
+            Optional[str]: Progress message.
+        """
+
+        return self._progress.get(job.id, job.message)
+
+    def _claim(self, job_id: int) -> bool:
+        now = datetime.utcnow()
+
+        # Polls of a running job only read, so they don't wait for the write 
+        # lock held by its phase
+        lease_expires = db.session.scalar(
+            db.select(SeasonArchiveJob.lease_expires)
+            .where(SeasonArchiveJob.id == job_id)
+        )
+        if lease_expires is not None and lease_expires >= now:
+            return False
+
+        result = db.session.execute(
+            db.update(SeasonArchiveJob)
+            .where(
+                SeasonArchiveJob.id == job_id,
+                SeasonArchiveJob.phase != "done",
+                SeasonArchiveJob.error.is_(None),
+                or_(
+                    SeasonArchiveJob.lease_expires.is_(None),
+                    SeasonArchiveJob.lease_expires < now
+                )
+            )
+            .values(
+                worker=self.worker,
+                lease_expires=now + timedelta(seconds=self.lease)
+            )
+            .execution_options(synchronize_session=False)
+        )
+        db.session.commit()
+        return result.rowcount == 1
+
+    def _advance(self, job_id: int, phase: str, next_phase: str,
+                 message: str) -> bool:
+        """Moves the job to the next phase and commits the transaction of the
+        phase, if this worker still holds the job.
+        """
+
+        now = datetime.utcnow()
+        values = {
+            "phase": next_phase, "message": message,
+            "lease_expires": now + timedelta(seconds=self.lease)
+        }
+        if next_phase == "done":
+            values.update(lease_expires=None, date_finished=now)
+
+        result = db.session.execute(
+            db.update(SeasonArchiveJob)
+            .where(
+                SeasonArchiveJob.id == job_id,
+                SeasonArchiveJob.phase == phase,
+                SeasonArchiveJob.worker == self.worker
+            )
+            .values(values)
+            .execution_options(synchronize_session=False)
+        )
+        if result.rowcount != 1:
+            db.session.rollback()
+            self._logger.warning(f"Season archive job {job_id} was taken "
+                                 "over by another worker")
+            return False
+
+        db.session.commit()
+        self._progress[job_id] = message
+        self._logger.info(f"Season archive job {job_id}: {message}")
+        return True
+
+    def _run(self, job_id: int) -> None:
+        with self._app.app_context():
+            try:
+                while True:
+                    job = db.session.get(
+                        SeasonArchiveJob, job_id, populate_existing=True
+                    )
+                    if job.is_finished() or job.worker != self.worker:
+                        break
+
+                    phase = job.phase
+                    next_phase = PHASES[PHASES.index(phase) + 1]
+                    message = getattr(self, f"_run_{phase}")(job)
+                    if not self._advance(job_id, phase, next_phase, message):
+                        break
+                    forget_current_season()
+                    forget_all_users()
+            except Exception as e:
+                db.session.rollback()
+                self._logger.exception(f"Season archive job {job_id} failed")
+                db.session.execute(
+                    db.update(SeasonArchiveJob)
+                    .where(
+                        SeasonArchiveJob.id == job_id,
+                        SeasonArchiveJob.worker == self.worker
+                    )
+                    .values(error=repr(e), lease_expires=None)
+                    .execution_options(synchronize_session=False)
+                )
+                db.session.commit()
+            finally:
+                self._progress.pop(job_id, None)
+
+    def _run_archive(self, job: SeasonArchiveJob) -> str:
+        season = Season.query.first()
+        if season is None:
+            return "Season was already archived"
+
+        job_id = job.id
+
+        def report(message: str) -> None:
+            self._progress[job_id] = message
+            self._logger.info(f"Season archive job {job_id}: {message}")
+
+        archived_season = None
+        if job.champion_team_id is not None:
+            archived_season = create_archived_season(season, job)
+            db.session.flush()
+            export_season(archived_season, self.export_dir)
+            report("Exported season games to cold storage")
+
+        roll_over_season(
+            archived_season, progress=report, rebuild_leaderboard=False
+        )
+        return "Archived season stats"
+
+    def _run_leaderboard(self, job: SeasonArchiveJob) -> str:
+        refresh_leaderboard()
+        return "Rebuilt leaderboard"
+
+    def _run_pictures(self, job: SeasonArchiveJob) -> str:
+        scorecards.clear()
+        return "Removed scorecard pictures"
+
+
+archiver = SeasonArchiver()
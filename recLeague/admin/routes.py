@@ -2,24 +2,25 @@ from datetime import datetime, timedelta
 
 from flask import (
     render_template, request, Blueprint, redirect, url_for, abort, flash, 
-    Response
+    Response, make_response
 )
 from flask.typing import ResponseReturnValue
 from flask_login import current_user
 
 from recLeague import db, bcrypt
 from recLeague.models import (
-    User, Game, Team, Division, Season, Settings, Stats, player_game_table, 
-    team_game_table, ArchivedSeason
+    User, Game, Team, Division, Season, Settings, SeasonArchiveJob
 )
 from recLeague.admin.forms import (
     UserForm, UsersListForm, TeamsListForm, CreateSeasonForm, 
     SeasonForm, SettingsForm, ArchiveSeasonForm
 )
 from recLeague.admin.utils import get_team_csv_text
-from recLeague.config import (
-    DIVISION_NAMES, SCORECARD_PICS_PATH, STAT_CATEGORY_KEYS
-)
+from recLeague.admin.archive import archiver
+from recLeague.users.utils import forget_user, forget_all_users
+from recLeague.main.utils import forget_current_season
+from recLeague.games.utils import game_card_options
+from recLeague.config import DIVISION_NAMES
 
 
 admin = Blueprint('admin', __name__)
@@ -45,6 +46,9 @@ def users() -> ResponseReturnValue:
             u.is_banned = user.status.data == 1
             u.is_admin = user.status.data == 2
         db.session.commit()
+
+        for u in users.items:
+            forget_user(u.id)
         flash('Users have been updated!', 'success')
         return redirect(url_for('admin.users'))
     
@@ -70,6 +74,7 @@ def games() -> ResponseReturnValue:
     page = request.args.get('page', 1, type=int)
     game_cat = request.args.get('cat', "Unverified", type=str)
     games = Game.query.filter(game_cat == 'All' or Game.verified == False) \
+        .options(*game_card_options()) \
         .order_by(Game.date_posted.desc()).paginate(page=page, per_page=20)
 
     # TODO: Remove sqlalchemy legacy code with new way of querying
@@ -99,6 +104,8 @@ def teams() -> ResponseReturnValue:
         if form.submit.data is False:
             return
 
+        # Players removed from or added to a team
+        player_ids = {p.id for t in all_teams for p in t.players}
         for i, team in enumerate(form.teams):
             db_team = all_teams[i]
             
@@ -106,11 +113,14 @@ def teams() -> ResponseReturnValue:
             for player in team.players:
                 if player.data > 0:
                     db_team.players.append(User.query.get(player.data))
+                    player_ids.add(player.data)
 
             db_team.division = (Division.query.get(team.division.data) 
                                 if team.division.data > 0 else None)
 
         db.session.commit()
+        for player_id in player_ids:
+            forget_user(player_id)
         flash('Teams have been updated!', 'success')
         return redirect(url_for('admin.teams'))
 
@@ -124,6 +134,12 @@ def create_season() -> ResponseReturnValue:
     if current_user.is_admin is False:
         abort(403)
 
+    # The scorecard pictures of the last season may not be removed yet
+    job = archiver.unfinished_job()
+    if job is not None:
+        flash('The last season is still being archived', 'warning')
+        return redirect(url_for('admin.season_archive', job_id=job.id))
+
     season = Season.query.first()
     if season is not None:
         flash('Season has already been created', 'warning')
@@ -141,6 +157,7 @@ def create_season() -> ResponseReturnValue:
             db.session.add(d)
 
         db.session.commit()
+        forget_current_season()
         flash('Season has been created!', 'success')
         return redirect(url_for('main.home'))
 
@@ -190,6 +207,7 @@ def season() -> ResponseReturnValue:
         season.date_start = form.date_start.data
         season.date_end = form.date_end.data
         db.session.commit()
+        forget_current_season()
         flash('Season has been updated!', 'success')
         return redirect(url_for('admin.season'))
 
@@ -204,39 +222,16 @@ def season() -> ResponseReturnValue:
     )
 
 
-def create_archived_season(s, form):
-    # Long way of counting teams with 2 players ... possibly in 
-    # future try to make this a query
-    teams = Team.query.all()
-    team_count = 0
-    for t in teams:
-        if len(t.players) >= 2:
-            team_count += 1
-
-    arch_season = ArchivedSeason(
-        name=s.name, date_start=s.date_start, date_end=s.date_end, 
-        num_games=Game.query.count(), num_teams=team_count, 
-        num_divisions=Division.query.count()
-    )
-
-    if form.summary.data is not None:
-        arch_season.summary = form.summary.data
-
-    champion_team = Team.query.get(form.champion_team.data)
-    arch_season.champion_team_name = champion_team.name
-    for p in champion_team.players:
-        arch_season.champions.append(p)
-
-    runner_up_team = Team.query.get(form.runner_up_team.data)
-    arch_season.runner_up_team_name = runner_up_team.name
-    for p in runner_up_team.players:
-        arch_season.runner_ups.append(p)
-
-    db.session.add(arch_season)
-
-
 @admin.route("/admin/season/delete", methods=['POST'])
 def delete_season() -> ResponseReturnValue:
+    if current_user.is_admin is False:
+        abort(403)
+
+    # Only one season can be archived at a time
+    job = archiver.unfinished_job()
+    if job is not None:
+        return redirect(url_for('admin.season_archive', job_id=job.id))
+
     season = Season.query.first_or_404()
     if season.is_active():
         abort(403)
@@ -250,62 +245,51 @@ def delete_season() -> ResponseReturnValue:
         ]
         form.champion_team.choices = team_choices
         form.runner_up_team.choices = team_choices
+        if not form.validate_on_submit():
+            abort(400)
 
-        create_archived_season(season, form)
-
-    users = User.query.all()
-    for u in users:
-        # Setting team to None might not be the best, 
-        # also might need to do this on games also
-        u.team = None
-        num_stats = len(STAT_CATEGORY_KEYS)
-        if u.season_stats is not None:
-            if u.prev_season_stats is None:
-                u.prev_season_stats = Stats()
-                u.prev_season_stats.set_stats([0]*num_stats, 0)
-            u.prev_season_stats.add_stats(u.season_stats)
-
-            if u.prev_season_best_stats is None:
-                u.prev_season_best_stats = Stats()
-                u.prev_season_best_stats.set_stats([0]*num_stats, 0)
-            u.prev_season_best_stats.max_stats(u.season_stats)
-
-            if u.prev_season_high_stats is None:
-                u.prev_season_high_stats = Stats()
-                u.prev_season_high_stats.set_stats([0]*num_stats, 0)
-            u.prev_season_high_stats.max_stats(u.season_high_stats)
-            
-            db.session.delete(u.season_stats)
-    
-    # Game stat deletion could possibly be changed with a relationship 
-    # cascade instead of this
-    for game in Game.query.all():
-        for stat in game.player_stats:
-            db.session.delete(stat)
-
-    # TODO: Do we need this commit here? It might cause issues if we run into an 
-    # error midway through
-    db.session.commit()
-
-    Game.__table__.drop(db.engine)
-    Team.__table__.drop(db.engine)
-    Division.__table__.drop(db.engine)
-    Season.__table__.drop(db.engine)
-
-    player_game_table.drop(db.engine)
-    team_game_table.drop(db.engine)
-
-    db.session.commit()
-    db.create_all()
-
-    # Delete scorecard photos
-    import os
-    d = SCORECARD_PICS_PATH
-    for f in os.listdir(d):
-        os.remove(os.path.join(d, f))
-
-    flash('Season has been archived!', 'success')
-    return redirect(url_for('main.home'))
+        job = archiver.start(
+            champion_team_id=form.champion_team.data, 
+            runner_up_team_id=form.runner_up_team.data, 
+            summary=form.summary.data
+        )
+    else:
+        job = archiver.start()
+
+    return redirect(url_for('admin.season_archive', job_id=job.id))
+
+
+@admin.route("/admin/season/archive/<int:job_id>", methods=['GET', 'POST'])
+def season_archive(job_id: int) -> ResponseReturnValue:
+    """Status page of a season being archived, reloaded by the browser until 
+    the job finishes.
+
+    Args:
+        job_id (int): ID of the season archive job.
+    """
+
+    if current_user.is_admin is False:
+        abort(403)
+
+    job = db.get_or_404(SeasonArchiveJob, job_id)
+
+    if request.method == 'POST':
+        archiver.retry(job)
+        return redirect(url_for('admin.season_archive', job_id=job.id))
+
+    # Picks up the job if the worker running it stopped
+    archiver.resume(job)
+    if job.is_finished():
+        forget_current_season()
+        forget_all_users()
+
+    response = make_response(render_template(
+        'admin_season_archive.html', title='Archiving Season', job=job, 
+        message=archiver.progress(job)
+    ))
+    if not job.is_finished() and job.error is None:
+        response.headers["Refresh"] = "2"
+    return response
 
 
 @admin.route("/admin/settings", methods=['GET', 'POST'])
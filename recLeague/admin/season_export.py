@@ -0,0 +1,358 @@
+""" Cold storage of the raw data of archived seasons.
+
+Games, stat lines, teams and rosters are dropped with the season tables when
+a season is archived. Before the drop they are exported to a compressed
+NumPy ``.npz`` file of columnar arrays, described by a JSON manifest next to
+it. The database only keeps the archived season and its player stats, while
+:py:class:`SeasonExport` answers historical queries straight from the files.
+
+Files are named by the archived season ID, ``season_<id>.npz`` and
+``season_<id>.json``. The manifest is written last, so an export without a
+manifest is incomplete.
+"""
+
+from __future__ import annotations
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional
+
+import numpy as np
+from sqlalchemy import and_, func
+
+from recLeague import db
+from recLeague.models import (
+    User, Stats, Game, Team, Division, ArchivedSeason,
+    player_game_table, team_game_table
+)
+from recLeague.stats.utils import STAT_COLUMNS, StatAggregate, aggregate_stats
+
+EXPORT_FORMAT = 1
+""" Version of the export file format, stored in the manifest.
+"""
+
+TEAM_RECORD_COLUMNS: list[str] = [
+    "wins", "losses", "games_played", "div_wins", "div_losses", "streak",
+    "score_diff"
+]
+""" Columns of the ``team_record`` array.
+"""
+
+
+def export_paths(archived_season_id: int,
+                 directory: str) -> tuple[str, str]:
+    """Returns the data and manifest file paths of an archived season.
+
+    Args:
+        archived_season_id (int): ID of the archived season.
+        directory (str): Directory of the exports.
+
+    Returns:
+        tuple[str, str]: Paths of the ``.npz`` data and the JSON manifest.
+    """
+
+    base = os.path.join(directory, f"season_{archived_season_id}")
+    return base + ".npz", base + ".json"
+
+
+def _timestamp(date: datetime) -> int:
+    return int(date.replace(tzinfo=timezone.utc).timestamp())
+
+
+def _game_arrays() -> tuple[dict[str, np.ndarray], dict[int, list[bool]]]:
+    games = db.session.execute(
+        db.select(
+            Game.id, Game.date_posted, Game.team_1_score, Game.team_2_score,
+            Game.verified, Game.comment, Game.picture_file, Game.is_sub
+        ).order_by(Game.id)
+    ).all()
+    game_ids = np.array([g.id for g in games], dtype=np.int64)
+
+    team_ids = np.full((len(games), 2), -1, dtype=np.int64)
+    for game_id, position, team_id in db.session.execute(
+            db.select(
+                team_game_table.c.game_id, team_game_table.c.position,
+                team_game_table.c.team_id
+            )):
+        team_ids[np.searchsorted(game_ids, game_id), position] = team_id
+
+    return {
+        "game_id": game_ids,
+        "game_date": np.array(
+            [_timestamp(g.date_posted) for g in games], dtype=np.int64
+        ),
+        "game_team_id": team_ids,
+        "game_score": np.array(
+            [(g.team_1_score, g.team_2_score) for g in games], dtype=np.int64
+        ).reshape(-1, 2),
+        "game_verified": np.array([g.verified for g in games], dtype=bool),
+        "game_comment": np.array([g.comment or "" for g in games], dtype=str),
+        "game_picture_file": np.array(
+            [g.picture_file or "" for g in games], dtype=str
+        ),
+    }, {g.id: g.is_sub or [] for g in games}
+
+
+def _line_arrays(is_sub: dict[int, list[bool]]) -> dict[str, np.ndarray]:
+    # Stat lines are matched to players by their order in the game. Lines 
+    # missing their player row are kept with player ID -1, so the game's 
+    # stats still add up.
+    lines = db.select(
+        Stats,
+        (func.row_number().over(
+            partition_by=Stats.game_id, order_by=Stats.id
+        ) - 1).label("position")
+    ).where(Stats.game_id.isnot(None)).subquery()
+
+    rows = db.session.execute(
+        db.select(
+            lines.c.game_id, 
+            func.coalesce(player_game_table.c.player_id, -1), 
+            lines.c.position, *[lines.c[key] for key in STAT_COLUMNS]
+        ).outerjoin(player_game_table, and_(
+            player_game_table.c.game_id == lines.c.game_id,
+            player_game_table.c.position == lines.c.position
+        )).order_by(lines.c.game_id, lines.c.position)
+    ).all()
+
+    packed = np.array(rows, dtype=np.int64).reshape(-1, 3 + len(STAT_COLUMNS))
+    subs = [
+        bool(position < len(is_sub[game_id]) and is_sub[game_id][position])
+        for game_id, _, position in packed[:, :3].tolist()
+    ]
+
+    return {
+        "line_game_id": packed[:, 0].copy(),
+        "line_player_id": packed[:, 1].copy(),
+        "line_position": packed[:, 2].copy(),
+        "line_is_sub": np.array(subs, dtype=bool),
+        "line_stats": packed[:, 3:].copy(),
+    }
+
+
+def _team_arrays() -> tuple[dict[str, np.ndarray], list[dict]]:
+    teams = Team.query.order_by(Team.id).all()
+    roster = db.session.execute(
+        db.select(User.team_id, User.id)
+        .where(User.team_id.isnot(None))
+        .order_by(User.team_id, User.id)
+    ).all()
+
+    arrays = {
+        "team_id": np.array([t.id for t in teams], dtype=np.int64),
+        "team_division_id": np.array(
+            [t.division_id if t.division_id is not None else -1
+             for t in teams],
+            dtype=np.int64
+        ),
+        "team_record": np.array(
+            [[getattr(t, key) for key in TEAM_RECORD_COLUMNS] for t in teams],
+            dtype=np.int64
+        ).reshape(-1, len(TEAM_RECORD_COLUMNS)),
+        "roster_team_id": np.array([r[0] for r in roster], dtype=np.int64),
+        "roster_player_id": np.array([r[1] for r in roster], dtype=np.int64),
+    }
+    names = [
+        {"id": t.id, "name": t.name, "division_id": t.division_id}
+        for t in teams
+    ]
+    return arrays, names
+
+
+def export_season(archived_season: ArchivedSeason, directory: str) -> str:
+    """Exports the games, stat lines, teams and rosters of the current
+    season to cold storage.
+
+    Must be called before the season tables are dropped, in the same
+    transaction, so the export matches the archived season. An existing
+    export of the archived season is replaced.
+
+    Args:
+        archived_season (ArchivedSeason): Archived season of the current
+            season, flushed so it has an ID.
+        directory (str): Directory of the exports.
+
+    Returns:
+        str: Path of the manifest.
+    """
+
+    data_path, manifest_path = export_paths(archived_season.id, directory)
+    os.makedirs(directory, exist_ok=True)
+
+    arrays, is_sub = _game_arrays()
+    arrays.update(_line_arrays(is_sub))
+    team_arrays, teams = _team_arrays()
+    arrays.update(team_arrays)
+
+    tmp_path = f"{data_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "wb") as f:
+        np.savez_compressed(f, **arrays)
+    digest = hashlib.sha256()
+    with open(tmp_path, "rb") as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(chunk)
+    os.replace(tmp_path, data_path)
+
+    manifest = {
+        "format": EXPORT_FORMAT,
+        "archived_season_id": archived_season.id,
+        "name": archived_season.name,
+        "date_start": archived_season.date_start.isoformat(),
+        "date_end": archived_season.date_end.isoformat(),
+        "date_exported": datetime.utcnow().isoformat(),
+        "data_file": os.path.basename(data_path),
+        "sha256": digest.hexdigest(),
+        "stat_columns": STAT_COLUMNS,
+        "team_record_columns": TEAM_RECORD_COLUMNS,
+        "teams": teams,
+        "divisions": [
+            {"id": d.id, "name": d.name}
+            for d in Division.query.order_by(Division.id)
+        ],
+        "arrays": {
+            name: {"dtype": str(a.dtype), "shape": list(a.shape)}
+            for name, a in arrays.items()
+        },
+    }
+
+    tmp_path = f"{manifest_path}.{os.getpid()}.tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp_path, manifest_path)
+
+    return manifest_path
+
+
+class SeasonExport:
+    """Reads an exported season without restoring it into the database.
+
+    Arrays are read from the ``.npz`` file on first use and kept in memory.
+    Array names and shapes are listed in the ``arrays`` field of the
+    :py:attr:`manifest`, with one row per game for ``game_*`` arrays, per
+    stat line for ``line_*`` arrays, per team for ``team_*`` arrays and per
+    player on a team for ``roster_*`` arrays.
+
+    Example:
+
+    .. code-block:: python
+
+        with SeasonExport.open(archived_season.id, directory) as export:
+            points = export.player_stats(user.id).sums
+
+    Args:
+        manifest_path (str): Path of the JSON manifest.
+
+    Raises:
+        ValueError: The export format is not supported.
+    """
+
+    def __init__(self, manifest_path: str) -> None:
+        with open(manifest_path) as f:
+            self.manifest: dict = json.load(f)
+
+        if self.manifest.get("format") != EXPORT_FORMAT:
+            raise ValueError(
+                f"Unsupported season export format "
+                f"{self.manifest.get('format')} in {manifest_path}"
+            )
+
+        self._data = np.load(
+            os.path.join(
+                os.path.dirname(manifest_path), self.manifest["data_file"]
+            ),
+            allow_pickle=False
+        )
+        self._arrays: dict[str, np.ndarray] = {}
+
+    @classmethod
+    def open(cls, archived_season_id: int,
+             directory: str) -> Optional[SeasonExport]:
+        """Opens the export of an archived season.
+
+        Args:
+            archived_season_id (int): ID of the archived season.
+            directory (str): Directory of the exports.
+
+        Returns:
+            Optional[SeasonExport]: Export, ``None`` if the season was not
+            exported.
+        """
+
+        manifest_path = export_paths(archived_season_id, directory)[1]
+        if not os.path.exists(manifest_path):
+            return None
+        return cls(manifest_path)
+
+    def __getitem__(self, name: str) -> np.ndarray:
+        if name not in self._arrays:
+            self._arrays[name] = self._data[name]
+        return self._arrays[name]
+
+    def __enter__(self) -> SeasonExport:
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._data.close()
+
+    def player_lines(self, player_id: int,
+                     verified_only: bool = True) -> np.ndarray:
+        """Returns the game stat lines of a player.
+
+        Args:
+            player_id (int): ID of the player.
+            verified_only (bool): Only include lines of verified games.
+
+        Returns:
+            np.ndarray: ``games x columns`` array in
+            :py:data:`STAT_COLUMNS <recLeague.stats.utils.STAT_COLUMNS>`
+            order.
+        """
+
+        mask = self["line_player_id"] == player_id
+        if verified_only:
+            game_index = np.searchsorted(
+                self["game_id"], self["line_game_id"]
+            )
+            mask &= self["game_verified"][game_index]
+        return self["line_stats"][mask]
+
+    def player_stats(self, player_id: int) -> StatAggregate:
+        """Aggregates the verified game stat lines of a player.
+
+        Args:
+            player_id (int): ID of the player.
+
+        Returns:
+            StatAggregate: Season totals, best game and averages.
+        """
+
+        return aggregate_stats(self.player_lines(player_id))
+
+    def team_games(self, team_id: int) -> np.ndarray:
+        """Returns the IDs of the games a team played.
+
+        Args:
+            team_id (int): ID of the team.
+
+        Returns:
+            np.ndarray: Game IDs in ascending order.
+        """
+
+        played = (self["game_team_id"] == team_id).any(axis=1)
+        return self["game_id"][played]
+
+    def roster(self, team_id: int) -> np.ndarray:
+        """Returns the IDs of the players on a team when it was archived.
+
+        Args:
+            team_id (int): ID of the team.
+
+        Returns:
+            np.ndarray: User IDs.
+        """
+
+        return self["roster_player_id"][self["roster_team_id"] == team_id]
@@ -1,6 +1,36 @@
-from recLeague.models import Team
+from __future__ import annotations
+import time
+from typing import Callable, Optional
+
+from sqlalchemy import case, func
+
+from recLeague import db
+from recLeague.models import (
+    User, Team, Game, Division, Season, Stats, HeadToHead, ArchivedSeason, 
+    SeasonPlayerStats, player_game_table, team_game_table
+)
+from recLeague.stats.utils import (
+    STAT_COLUMNS, refresh_leaderboard, season_stats_aggregate
+)
+from recLeague.cache import bump_league_version
 from recLeague.config import NUM_TEAM_PLAYERS
 
+SEASON_TABLES = [
+    player_game_table, team_game_table, HeadToHead.__table__, 
+    Game.__table__, Team.__table__, Division.__table__, Season.__table__
+]
+""" Tables holding the current season, dropped and recreated when the season 
+is archived.
+"""
+
+# Previous season stat columns of users, how the archived season stats are 
+# combined into each and the prefix of the archived season columns
+_ROLLOVER_COLUMNS = [
+    ("prev_season_stats_id", "sum", ""), 
+    ("prev_season_best_stats_id", "max", ""), 
+    ("prev_season_high_stats_id", "max", "high_"), 
+]
+
 
 def get_team_csv_text() -> str:
     """Returns a string in CSV format with all teams and players on the team.
@@ -18,3 +48,219 @@ def get_team_csv_text() -> str:
         csv += ",".join([team.name.replace(",", "")] + players) + "\n"
 
     return csv
+
+
+def _archive_season_stats(archived_season_id: int) -> None:
+    """Copies the season stats of every player who played into rows of the 
+    archived season with one INSERT ... SELECT.
+    """
+
+    users = User.__table__
+    totals = Stats.__table__.alias("totals")
+    highs = Stats.__table__.alias("highs")
+
+    columns = (
+        ["archived_season_id", "user_id"] + STAT_COLUMNS 
+        + ["high_" + key for key in STAT_COLUMNS]
+    )
+    rows = db.select(
+        db.literal(archived_season_id), users.c.id, 
+        *[totals.c[key] for key in STAT_COLUMNS], 
+        *[func.coalesce(highs.c[key], 0) for key in STAT_COLUMNS]
+    ).select_from(users) \
+        .join(totals, totals.c.id == users.c.season_stats_id) \
+        .outerjoin(highs, highs.c.id == users.c.season_high_stats_id) \
+        .where(totals.c.game_count > 0)
+
+    db.session.execute(
+        db.insert(SeasonPlayerStats).from_select(columns, rows)
+    )
+
+
+def _create_missing_stats(column: str, 
+                          archived_season_id: Optional[int] = None) -> None:
+    """Gives every player of the archived season, or of any archived season 
+    if None, a zeroed stat row for a previous season column.
+    """
+
+    players = db.select(SeasonPlayerStats.user_id)
+    if archived_season_id is not None:
+        players = players.where(
+            SeasonPlayerStats.archived_season_id == archived_season_id
+        )
+
+    user_ids = list(db.session.scalars(
+        db.select(User.id).where(
+            User.id.in_(players), getattr(User, column).is_(None)
+        )
+    ))
+    if len(user_ids) == 0:
+        return
+
+    stats_ids = db.session.scalars(
+        db.insert(Stats).returning(Stats.id, sort_by_parameter_order=True), 
+        [dict.fromkeys(STAT_COLUMNS, 0) for _ in user_ids]
+    ).all()
+    db.session.execute(
+        db.update(User.__table__)
+        .where(User.id == db.bindparam("b_id"))
+        .values({column: db.bindparam("b_stats_id")}), 
+        [{"b_id": u, "b_stats_id": s} for u, s in zip(user_ids, stats_ids)]
+    )
+
+
+def _combine_season_stats(column: str, combine: str, prefix: str, 
+                          archived_season_id: int) -> None:
+    """Adds or maxes the archived season stats of every player into a 
+    previous season stat row with one UPDATE.
+    """
+
+    prev = Stats.__table__
+    season = SeasonPlayerStats.__table__
+
+    values = {}
+    for key in STAT_COLUMNS:
+        value = season.c[prefix + key]
+        if combine == "sum":
+            values[key] = prev.c[key] + value
+        else:
+            values[key] = case((prev.c[key] >= value, prev.c[key]), 
+                               else_=value)
+
+    db.session.execute(
+        db.update(prev).values(values).where(
+            prev.c.id == getattr(User, column), 
+            season.c.user_id == User.id, 
+            season.c.archived_season_id == archived_season_id
+        )
+    )
+
+
+def rebuild_previous_season_stats() -> bool:
+    """Recomputes the previous season stats of every player from their 
+    :py:class:`SeasonPlayerStats <recLeague.models.SeasonPlayerStats>` 
+    rows, with one UPDATE ... FROM :py:func:`season_stats_aggregate 
+    <recLeague.stats.utils.season_stats_aggregate>` per column.
+
+    Seasons archived before season player stats were kept have games but no 
+    rows. Their stats only exist in the previous season stats, so nothing 
+    is changed if there are any.
+
+    Returns:
+        bool: True if the previous season stats were rebuilt.
+    """
+
+    legacy_seasons = db.session.scalar(
+        db.select(func.count()).select_from(ArchivedSeason).where(
+            ArchivedSeason.num_games > 0, 
+            ArchivedSeason.id.not_in(
+                db.select(SeasonPlayerStats.archived_season_id)
+            )
+        )
+    )
+    if legacy_seasons > 0:
+        return False
+
+    prev = Stats.__table__
+    for column, combine, prefix in _ROLLOVER_COLUMNS:
+        _create_missing_stats(column)
+
+        totals = season_stats_aggregate(combine, prefix).subquery()
+        db.session.execute(
+            db.update(prev)
+            .values({key: totals.c[key] for key in STAT_COLUMNS})
+            .where(
+                prev.c.id == getattr(User, column), 
+                totals.c.user_id == User.id
+            )
+        )
+
+    db.session.expire_all()
+    bump_league_version()
+    return True
+
+
+def roll_over_season(
+        archived_season: Optional[ArchivedSeason] = None, 
+        progress: Optional[Callable[[str], None]] = None, 
+        rebuild_leaderboard: bool = True) -> None:
+    """Ends the current season by saving the season stats of every player 
+    to the archived season, then recreating the season tables.
+
+    The saved :py:class:`SeasonPlayerStats 
+    <recLeague.models.SeasonPlayerStats>` are combined into the previous 
+    season stats of the players, which cache their aggregates. Without an 
+    archived season the season stats are dropped.
+
+    Everything is done with a few set based statements in the session's 
+    transaction, including dropping and recreating the 
+    :py:data:`SEASON_TABLES`, so the season is either fully rolled over or 
+    not at all once the caller commits. The leaderboard is rebuilt, unless 
+    ``rebuild_leaderboard`` is ``False``, and the league version bumped.
+
+    Args:
+        archived_season (Optional[ArchivedSeason]): Archived season of the 
+            current season.
+        progress (Optional[Callable[[str], None]]): Called with a message 
+            after each step.
+        rebuild_leaderboard (bool): Rebuild the leaderboard in the same 
+            transaction. Pass ``False`` to rebuild it later with 
+            :py:func:`refresh_leaderboard 
+            <recLeague.stats.utils.refresh_leaderboard>`.
+    """
+
+    start = time.perf_counter()
+
+    def report(message: str) -> None:
+        if progress is not None:
+            progress(f"{message} ({time.perf_counter() - start:.2f}s)")
+
+    # Write pending changes, the rest of the rollover bypasses the ORM
+    db.session.flush()
+
+    db.session.execute(db.update(User.__table__).values(team_id=None))
+    report("Removed players from teams")
+
+    if archived_season is not None:
+        _archive_season_stats(archived_season.id)
+        report("Saved season stats to the archived season")
+
+        for column, combine, prefix in _ROLLOVER_COLUMNS:
+            _create_missing_stats(column, archived_season.id)
+            _combine_season_stats(
+                column, combine, prefix, archived_season.id
+            )
+        report("Combined season stats into previous season stats")
+
+    # Season stats and game stat lines are not needed anymore
+    season_stats_ids = list(db.session.scalars(
+        db.select(User.season_stats_id).where(User.season_stats_id.isnot(None))
+        .union_all(
+            db.select(User.season_high_stats_id)
+            .where(User.season_high_stats_id.isnot(None))
+        )
+    ))
+    db.session.execute(
+        db.update(User.__table__)
+        .values(season_stats_id=None, season_high_stats_id=None)
+    )
+    db.session.execute(db.delete(Stats.__table__).where(
+        Stats.game_id.isnot(None)
+    ))
+    # Deleted in batches to stay under the bound parameter limit of SQLite
+    for i in range(0, len(season_stats_ids), 5000):
+        db.session.execute(db.delete(Stats.__table__).where(
+            Stats.id.in_(season_stats_ids[i:i + 5000])
+        ))
+    report("Deleted season stats")
+
+    db.session.expire_all()
+    if rebuild_leaderboard:
+        refresh_leaderboard()
+        report("Rebuilt leaderboard")
+
+    connection = db.session.connection()
+    db.metadata.drop_all(connection, tables=SEASON_TABLES)
+    db.metadata.create_all(connection, tables=SEASON_TABLES)
+    bump_league_version()
+    report("Recreated season tables")
@@ -0,0 +1,320 @@
+""" Cache for league data keyed by the league version.
+
+Every write to league data bumps the :py:class:`LeagueVersion
+<recLeague.models.LeagueVersion>` counter, and every cache key includes the
+current version. Cached values are never served after the data they were
+computed from changes, so routes never need to invalidate the cache.
+
+Values are kept in a per-process LRU cache, and optionally in a file cache
+shared between processes (e.g. Gunicorn workers) when ``LEAGUE_CACHE_DIR``
+is set in the Flask config. Only cache plain data, not database objects.
+"""
+
+from __future__ import annotations
+import hashlib
+import os
+import pickle
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Optional
+
+from flask import Flask, g, has_app_context
+from sqlalchemy import event
+
+from recLeague import db
+from recLeague.models import LeagueVersion, SeasonArchiveJob
+
+_MISSING = object()
+
+
+class LRUCache:
+    """Thread safe in-process cache with a size limit and time to live.
+
+    Args:
+        max_size (int): Maximum number of entries. The least recently used
+            entry is dropped when full.
+        ttl (float): Seconds an entry is kept.
+    """
+
+    def __init__(self, max_size: int = 512, ttl: float = 300) -> None:
+        self.max_size = max_size
+        self.ttl = ttl
+        self._entries: OrderedDict[str, tuple[float, Any]] = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str, default: Any = None) -> Any:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return default
+
+            if entry[0] < time.monotonic():
+                del self._entries[key]
+                return default
+
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def set(self, key: str, value: Any) -> None:
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key: str) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+
+class FileCache:
+    """Cache shared between processes with one pickled file per entry.
+
+    Files are written atomically, so readers in other processes never see a
+    partial entry. Expired files are removed when read and every
+    ``prune_interval`` writes.
+
+    Args:
+        directory (str): Directory to store cache files.
+        ttl (float): Seconds an entry is kept.
+        prune_interval (int): Number of writes between removing expired
+            files.
+    """
+
+    def __init__(self, directory: str, ttl: float = 300,
+                 prune_interval: int = 100) -> None:
+        self.directory = directory
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self._writes = 0
+
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        name = hashlib.sha1(key.encode('utf-8')).hexdigest()
+        return os.path.join(self.directory, name + ".cache")
+
+    def get(self, key: str, default: Any = None) -> Any:
+        path = self._path(key)
+        try:
+            with open(path, "rb") as f:
+                expires, value = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return default
+
+        if expires < time.time():
+            self._remove(path)
+            return default
+
+        return value
+
+    def set(self, key: str, value: Any) -> None:
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            pickle.dump((time.time() + self.ttl, value), f)
+        os.replace(tmp_path, self._path(key))
+
+        self._writes += 1
+        if self._writes % self.prune_interval == 0:
+            self.prune()
+
+    def delete(self, key: str) -> None:
+        self._remove(self._path(key))
+
+    def prune(self) -> None:
+        """Removes expired cache files."""
+
+        now = time.time()
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            try:
+                if os.path.getmtime(path) + self.ttl < now:
+                    os.remove(path)
+            except OSError:
+                pass
+
+    def clear(self) -> None:
+        for name in os.listdir(self.directory):
+            self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path: str) -> None:
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+class LeagueCache:
+    """Two tier cache with keys that include the league version.
+
+    Configured with ``LEAGUE_CACHE_SIZE``, ``LEAGUE_CACHE_TTL`` and
+    ``LEAGUE_CACHE_DIR`` from the Flask config.
+    """
+
+    def __init__(self) -> None:
+        self.memory = LRUCache()
+        self.shared: Optional[FileCache] = None
+
+    def init_app(self, app: Flask) -> None:
+        ttl = app.config.get("LEAGUE_CACHE_TTL", 300)
+        self.memory = LRUCache(app.config.get("LEAGUE_CACHE_SIZE", 512), ttl)
+
+        cache_dir = app.config.get("LEAGUE_CACHE_DIR")
+        self.shared = FileCache(cache_dir, ttl) if cache_dir else None
+
+    @staticmethod
+    def _key(name: str, args: tuple) -> str:
+        return f"{get_league_version()}:{name}:{args!r}"
+
+    def get(self, name: str, *args: Any, default: Any = None) -> Any:
+        """Returns the cached value for the current league version.
+
+        Args:
+            name (str): Name of the cached value.
+            *args: Arguments the value depends on.
+            default: Value returned if nothing is cached.
+        """
+
+        key = self._key(name, args)
+        value = self.memory.get(key, _MISSING)
+        if value is not _MISSING:
+            return value
+
+        if self.shared is not None:
+            value = self.shared.get(key, _MISSING)
+            if value is not _MISSING:
+                self.memory.set(key, value)
+                return value
+
+        return default
+
+    def set(self, name: str, value: Any, *args: Any) -> None:
+        """Caches a value for the current league version.
+
+        Nothing is cached while the session has uncommitted writes. The
+        value could include them, and the version they bumped is reused by
+        the next write if the transaction is rolled back.
+
+        Args:
+            name (str): Name of the cached value.
+            value: Value to cache. Must be picklable if the shared file
+                cache is used.
+            *args: Arguments the value depends on.
+        """
+
+        if has_uncommitted_writes():
+            return
+
+        key = self._key(name, args)
+        self.memory.set(key, value)
+        if self.shared is not None:
+            self.shared.set(key, value)
+
+    def get_or_set(self, name: str, func: Callable[..., Any],
+                   *args: Any) -> Any:
+        """Returns the cached value, or calls ``func(*args)`` and caches the
+        result.
+
+        Args:
+            name (str): Name of the cached value.
+            func (Callable): Function computing the value.
+            *args: Arguments passed to the function, also used in the key.
+        """
+
+        value = self.get(name, *args, default=_MISSING)
+        if value is _MISSING:
+            value = func(*args)
+            self.set(name, value, *args)
+
+        return value
+
+    def clear(self) -> None:
+        self.memory.clear()
+        if self.shared is not None:
+            self.shared.clear()
+
+
+cache = LeagueCache()
+
+
+def get_league_version() -> int:
+    """Returns the current league version.
+
+    The version is read from the database once per app context.
+    """
+
+    if has_app_context() and "league_version" in g:
+        return g.league_version
+
+    version = db.session.scalar(db.select(LeagueVersion.version)) or 0
+    if has_app_context():
+        g.league_version = version
+
+    return version
+
+
+def bump_league_version() -> None:
+    """Increments the league version.
+
+    Writes through the session bump the version automatically. This only
+    needs to be called after writes that bypass the session, such as
+    dropping tables.
+    """
+
+    _bump(db.session)
+
+
+def has_uncommitted_writes() -> bool:
+    """Returns True if the session bumped the league version in a
+    transaction that isn't committed yet.
+    """
+
+    return has_app_context() and db.session.info.get("league_writes", False)
+
+
+def _bump(session) -> None:
+    connection = session.connection()
+    version = LeagueVersion.__table__.c.version
+    result = connection.execute(
+        db.update(LeagueVersion).values(version=version + 1)
+    )
+    if result.rowcount == 0:
+        connection.execute(db.insert(LeagueVersion).values(version=1))
+
+    session.info["league_writes"] = True
+    if has_app_context():
+        g.pop("league_version", None)
+
+
+@event.listens_for(db.session, "after_flush")
+def _bump_on_flush(session, flush_context) -> None:
+    """Bumps the league version in the same transaction as any flush that
+    wrote league data.
+    """
+
+    changed = session.new | session.dirty | session.deleted
+    if any(
+        not isinstance(obj, (LeagueVersion, SeasonArchiveJob)) 
+        for obj in changed
+    ):
+        _bump(session)
+
+
+@event.listens_for(db.session, "after_commit")
+@event.listens_for(db.session, "after_rollback")
+def _end_league_writes(session) -> None:
+    """Allows caching again once the transaction that bumped the league
+    version ends. After a rollback the version is read again, since the one
+    seen inside the transaction was never committed.
+    """
+
+    if session.info.pop("league_writes", False) and has_app_context():
+        g.pop("league_version", None)
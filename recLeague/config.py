@@ -21,6 +21,24 @@ class FlaskConfig:
 
     DEBUG = True
 
+    LEAGUE_CACHE_SIZE = 512
+    LEAGUE_CACHE_TTL = 300
+    LEAGUE_CACHE_DIR = None
+
+    USER_CACHE_TTL = 30
+    SEASON_CACHE_TTL = 60
+
+    SCORECARD_WORKERS = 2
+    SCORECARD_PICS_DIR = None
+    SCORECARD_SPOOL_DIR = None
+    SCORECARD_SENDFILE = None
+    SCORECARD_ACCEL_PREFIX = "/protected_scorecards"
+
+    SQLITE_JOURNAL_MODE = "WAL"
+
+    SEASON_ARCHIVE_LEASE = 600
+    SEASON_EXPORT_DIR = None
+
 
 def copy_default_config_file():
     shutil.copyfile(
@@ -217,7 +235,7 @@ MIN_LIFETIME_AVERAGE_GAMES: int = int(
 
 
 # Scorecard pics
-def get_scorecard_pics_static_path():
+def get_scorecard_pics_instance_path():
     # TODO: Comment on method
 
     uri = SQLALCHEMY_DATABASE_URI
@@ -233,8 +251,11 @@ def get_scorecard_pics_static_path():
     return os.path.join("scorecard_pics", directory)
 
 
-SCORECARD_PICS_STATIC_PATH: str = get_scorecard_pics_static_path()
-""" Path to scorecard pics relative to the static folder.
+SCORECARD_PICS_INSTANCE_PATH: str = get_scorecard_pics_instance_path()
+""" Path to scorecard pics relative to the Flask instance folder.
+
+    Pictures are kept out of the static folder so they are only sent after 
+    checking the user can see them.
     
     This is dynamically created from :py:data:`SQLALCHEMY_DATABASE_URI` by
     using the basename of the URI in combination with the full URI hashed to a 
@@ -258,15 +279,6 @@ SCORECARD_PICS_STATIC_PATH: str = get_scorecard_pics_static_path()
     :meta hide-value:
 """
 
-
-SCORECARD_PICS_PATH: str = os.path.join(
-    "recLeague", "static", SCORECARD_PICS_STATIC_PATH
-)
-""" Path to scorecard pics relative to the recLeague module path.
-
-    :meta hide-value:
-"""
-
 # Appearance
 branding_dict = config_dict["LEAGUE_INFO"]["branding"]
 
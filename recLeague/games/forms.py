@@ -10,7 +10,9 @@ from wtforms.validators import (
 )
 from wtforms.fields.html5 import IntegerField
 
-from recLeague.models import User, Team, Stats, Game
+from recLeague.models import Stats, Game
+from recLeague.teams.utils import get_team_choices, get_player_choices
+from recLeague.games.scorecards import check_scorecard_header
 from recLeague.config import (
     STAT_CATEGORIES, NUM_TEAM_PLAYERS, MIN_GAME_SCORE, MAX_GAME_SCORE, 
     STAT_CATEGORY_KEYS, SCORECARD_REQUIRED
@@ -42,6 +44,18 @@ class TeamCountValdiator(object):
             )
 
 
+class ScorecardImage(object):
+    """ Custom wtform validator checking the header of a scorecard picture """
+    def __call__(self, form, field):
+        """ Check if picture is an image that can be processed """
+        if not field.data:
+            return
+
+        message = check_scorecard_header(field.data.stream)
+        if message is not None:
+            raise ValidationError(message)
+
+
 def _get_stat_field_validators(stat_form_settings):
     validators = [InputRequired()]
     if stat_form_settings is not None:
@@ -170,35 +184,12 @@ class GameForm(FlaskForm):
         team. Player choices are set to all players that have a team.
         """
 
-        # Set team choices ... only have teams with 2 players
-        # TODO: get query filter working
-        # team_choices = [
-        #     (t.id, t.name) 
-        #     for t in Team.query.filter(
-        #         func.length(Team.players) == 1
-        #     ).order_by(Team.name)
-        # ]
-
-        team_choices = [
-            (t.id, t.name) 
-            for t in Team.query.order_by('name') 
-            if len(t.players) >= NUM_TEAM_PLAYERS
-        ] 
+        team_choices = get_team_choices(full=True)
         self.team_1.choices = team_choices
         self.team_2.choices = [(-1, "---")] + team_choices
 
         # Possibly decide to let any user play in games?
-        guest_players = [
-            (u.id, "*Guest " + str(i+1)) 
-            for i, u in enumerate(User.query.filter_by(name='Guest Player').all())
-        ]
-        player_choices = (
-            guest_players + [
-                (p.id, p.name) 
-                for p in User.query.order_by(User.name)
-                .filter(User.team != None)  # noqa: E711
-            ]
-        )
+        player_choices = get_player_choices()
         
         add_players = len(self.team_1_players.data) == 0
         for i in range(NUM_TEAM_PLAYERS):
@@ -219,10 +210,13 @@ class GameForm(FlaskForm):
 
         if required and SCORECARD_REQUIRED:
             self.picture.validators = [
-                FileAllowed(['jpg', 'png', 'jpeg']), FileRequired()
+                FileAllowed(['jpg', 'png', 'jpeg']), FileRequired(), 
+                ScorecardImage()
             ]
         else:
-            self.picture.validators = [FileAllowed(['jpg', 'png', 'jpeg'])]    
+            self.picture.validators = [
+                FileAllowed(['jpg', 'png', 'jpeg']), ScorecardImage()
+            ]
 
     def set_form(self, game: Optional[Game]) -> None:
         """Sets the form with game data.
@@ -1,5 +1,3 @@
-import os
-
 from flask import (
     render_template, url_for, flash, redirect, request, abort, Blueprint
 )
@@ -9,13 +7,16 @@ from flask_login import current_user
 from numpy import transpose, stack 
 
 from recLeague import db
-from recLeague.models import Game, Season
+from recLeague.models import Game
 from recLeague.games.forms import GameForm
 from recLeague.games.utils import (
-    calculate_stats, set_game, is_game_user_modifiable
+    GameResult, update_season_stats, set_game, is_game_user_modifiable
 )
+from recLeague.games.scorecards import scorecards
+from recLeague.main.utils import get_current_season
+from recLeague.cache import get_league_version
 from recLeague.config import (
-    NUM_TEAM_PLAYERS, STAT_CATEGORY_NAMES, SCORECARD_PICS_STATIC_PATH
+    NUM_TEAM_PLAYERS, STAT_CATEGORY_NAMES
 )
 
 
@@ -27,8 +28,7 @@ def submit_game() -> ResponseReturnValue:
     """Route to submit a new game.
     """
 
-    # TODO: move to helper function
-    season = Season.query.first()
+    season = get_current_season()
     if season is None or season.is_active() is False:
         abort(403)
 
@@ -57,7 +57,8 @@ def submit_game() -> ResponseReturnValue:
 
     return render_template(
         'submit_game.html', title='Submit Game', form=form, 
-        legend='Submit Game', first=(request.method == 'GET'), edit=False
+        legend='Submit Game', first=(request.method == 'GET'), edit=False, 
+        roster_version=get_league_version()
     )
 
 
@@ -79,25 +80,25 @@ def update_game(game_id: int) -> ResponseReturnValue:
 
     # Check if successfully edited game data
     if form.validate_on_submit():
+        old_picture_file = game.picture_file
         if game.verified:
-            teams = []
-            for team in game.teams:
-                teams.append(team)
-            players = []
-            for player in game.players:
-                players.append(player)
+            old_result = GameResult.from_game(game)
             
             set_game(form, game)
+            db.session.flush()
             
-            # Update season stats for all teams and players before 
-            # and after the edit
-            teams = list(set(teams) | set(game.teams))
-            players = list(set(players) | set(game.players))
-            calculate_stats(teams, players)
+            # Swap the old game result for the edited one in the season 
+            # stats of all teams and players before and after the edit
+            update_season_stats(
+                removed=[old_result], added=[GameResult.from_game(game)]
+            )
             
         else:
             set_game(form, game)
         db.session.commit()
+
+        if game.picture_file != old_picture_file:
+            scorecards.release(old_picture_file)
         flash('Your game has been updated!', 'success')
         return redirect(url_for('games.game', game_id=game.id))
     elif request.method == 'GET':
@@ -105,7 +106,8 @@ def update_game(game_id: int) -> ResponseReturnValue:
 
     return render_template(
         'submit_game.html', title='Update Game', form=form, 
-        legend='Update Game', first=False, edit=True
+        legend='Update Game', first=False, edit=True, 
+        roster_version=get_league_version()
     )
 
 
@@ -122,21 +124,50 @@ def game(game_id: int) -> ResponseReturnValue:
         for i in range(NUM_TEAM_PLAYERS * 2)
     ))
     if game.picture_file is not None:
-        img_url = url_for(
-            'static', 
-            filename=os.path.join(
-                SCORECARD_PICS_STATIC_PATH, game.picture_file
-            )
-        )
+        img_url = scorecards.picture_url(game)
+        img_srcsets = scorecards.picture_srcsets(game)
     else:
         img_url = None
+        img_srcsets = None
 
     return render_template(
         'game.html', game=game, t_stats=transpose(stats),
-        stat_names=STAT_CATEGORY_NAMES, img_url=img_url
+        stat_names=STAT_CATEGORY_NAMES, img_url=img_url, 
+        img_srcsets=img_srcsets
     )
 
 
+@games.route("/game/<int:game_id>/scorecard/<file_name>")
+def scorecard(game_id: int, file_name: str) -> ResponseReturnValue:
+    """Route to view a size of a game's scorecard picture.
+
+    The file is sent by the front proxy when ``SCORECARD_SENDFILE`` is set, 
+    see :py:meth:`send_picture 
+    <recLeague.games.scorecards.ScorecardProcessor.send_picture>`.
+    
+    Args:
+        game_id (int): ID of game
+        file_name (str): File name of the picture size
+
+    :statuscode 200: Picture of the game.
+    :statuscode 206: Requested range of the picture.
+    :statuscode 304: Picture is unchanged.
+    :statuscode 404: Picture is not a processed picture of the game.
+    """
+    game = db.session.execute(
+        db.select(Game.id, Game.picture_file, Game.picture_manifest)
+        .where(Game.id == game_id)
+    ).first()
+    
+    # Only pictures of this game can be requested
+    if game is None or file_name not in scorecards.picture_files(game):
+        abort(404)
+    if scorecards.is_processed(file_name) is False:
+        abort(404)
+
+    return scorecards.send_picture(file_name)
+
+
 @games.route("/game/<int:game_id>/delete", methods=['POST'])
 def delete_game(game_id: int) -> ResponseReturnValue:
     """Route for deleting a game.
@@ -148,11 +179,16 @@ def delete_game(game_id: int) -> ResponseReturnValue:
 
     if is_game_user_modifiable(game) is False:
         abort(403)
+
+    result = GameResult.from_game(game) if game.verified else None
+    picture_file = game.picture_file
     db.session.delete(game)
-    db.session.commit()
+    db.session.flush()
 
-    calculate_stats(game.teams, game.players)
+    if result is not None:
+        update_season_stats(removed=[result])
     db.session.commit()
+    scorecards.release(picture_file)
     flash('Your game has been deleted!', 'success')
     
     return (
@@ -180,7 +216,7 @@ def verify_game(game_id: int) -> ResponseReturnValue:
         abort(403)
     game.verified = True
 
-    calculate_stats(game.teams, game.players)
+    update_season_stats(added=[GameResult.from_game(game)])
 
     db.session.commit()
     flash('Game has been verified!', 'success')
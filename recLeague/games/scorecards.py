@@ -0,0 +1,762 @@
+""" Background processing of scorecard pictures.
+
+Decoding and shrinking a multi-megapixel phone photo takes hundreds of
+milliseconds, so it is kept out of the request. Uploads are written as is to
+a spool directory and processed by a small thread pool. Until a picture is
+processed, its game shows a placeholder.
+
+Each picture is saved in several sizes, as both WebP and JPEG, so browsers
+can download the smallest picture fitting the screen. The sizes and files
+are described by a manifest stored on the game, see
+:py:func:`scorecard_manifest`.
+
+Spooled files are claimed with an atomic rename before processing, so
+leftover uploads can be picked up again by any process after a restart
+without being processed twice. Files claimed by a process that died are put
+back in the spool at startup. Files that fail to process are kept with a
+``.failed`` extension and their game shows an error picture until they are
+retried with :py:meth:`ScorecardProcessor.retry_failed`.
+
+Pictures are stored in the Flask instance folder rather than the static
+folder, so they are only sent by the ``games.scorecard`` route after it
+checked the user can see the game. Pictures are named by a hash of the
+uploaded file, so identical uploads are stored once, and sharded into
+subdirectories by the first characters of the name. Files are shared by
+every game with the same ``Game.picture_file``, and are removed once no game
+references them, either when a picture is replaced or by
+:py:meth:`ScorecardProcessor.collect_garbage`.
+"""
+
+from __future__ import annotations
+import hashlib
+import logging
+import mimetypes
+import os
+import shutil
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import IO, Optional
+
+from flask import Flask, Response, current_app, request, url_for
+from PIL import Image
+from werkzeug.utils import send_file
+
+from recLeague import db
+from recLeague.models import Game
+from recLeague.config import SCORECARD_PICS_INSTANCE_PATH
+
+DERIVATIVES = (("thumb", 320), ("medium", 720), ("full", 1080))
+""" Name and maximum width and height of each saved size of a scorecard
+picture, smallest first.
+"""
+
+DERIVATIVE_FORMATS = (("webp", "webp"), ("jpeg", "jpg"))
+""" Image format and file extension of each saved size. The full size JPEG
+is written last and keeps the file name stored in ``Game.picture_file``.
+"""
+
+PICTURE_FORMATS = ("JPEG", "PNG")
+""" Image formats accepted for scorecard pictures.
+"""
+
+PLACEHOLDER_STATIC_PATH = "scorecard_processing.svg"
+""" Path of the picture shown while a scorecard is processed, relative to the
+static folder.
+"""
+
+FAILED_STATIC_PATH = "scorecard_failed.svg"
+""" Path of the picture shown when a scorecard failed to process, relative 
+to the static folder.
+"""
+
+ORPHAN_GRACE_PERIOD = 60 * 60
+""" Seconds an unreferenced picture is kept after it was last uploaded, so
+pictures of games still being submitted are never removed.
+"""
+
+PICTURE_MAX_AGE = 365 * 24 * 60 * 60
+""" Seconds browsers cache a picture. Pictures are named by their content, so
+they never change.
+"""
+
+_SPOOL_EXTENSION = ".upload"
+_WORK_EXTENSION = ".work"
+_FAILED_EXTENSION = ".failed"
+_HASH_LENGTH = 16
+_SHARD_LENGTH = 2
+_GC_CURSOR = "gc_cursor"
+
+
+def check_scorecard_header(stream: IO[bytes]) -> Optional[str]:
+    """Checks an uploaded scorecard picture without decoding it.
+
+    Only the image header is read, so this is cheap enough to run in the
+    request. The stream is rewound afterwards.
+
+    Args:
+        stream (IO[bytes]): Uploaded file.
+
+    Returns:
+        Optional[str]: Error message if the picture can't be used, otherwise
+        None.
+    """
+
+    try:
+        with Image.open(stream) as image:
+            image_format = image.format
+            width, height = image.size
+    except (OSError, Image.DecompressionBombError):
+        return "Scorecard picture is not a valid image."
+    finally:
+        stream.seek(0)
+
+    if image_format not in PICTURE_FORMATS:
+        return "Scorecard picture must be a JPEG or PNG image."
+    if (Image.MAX_IMAGE_PIXELS is not None
+            and width * height > Image.MAX_IMAGE_PIXELS):
+        return "Scorecard picture is too large."
+
+    return None
+
+
+def _is_running(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Running as another user
+        return True
+    return True
+
+
+def _fit(size: tuple[int, int], max_size: int) -> tuple[int, int]:
+    scale = min(1, max_size / size[0], max_size / size[1])
+    return (max(1, round(size[0] * scale)), max(1, round(size[1] * scale)))
+
+
+def picture_shard(picture_file: str) -> str:
+    """Returns the subdirectory a picture and its derivatives are stored in.
+    """
+
+    return picture_file[:_SHARD_LENGTH]
+
+
+def _picture_base(file_name: str) -> str:
+    return os.path.splitext(file_name)[0].split("_")[0]
+
+
+def derivative_file(picture_file: str, name: str, extension: str) -> str:
+    """Returns the file name of one size and format of a picture.
+
+    Args:
+        picture_file (str): File name of the full size JPEG.
+        name (str): Name of the size in :py:data:`DERIVATIVES`.
+        extension (str): File extension of the format.
+    """
+
+    base = _picture_base(picture_file)
+    if name == "full":
+        return f"{base}.{extension}"
+    return f"{base}_{name}.{extension}"
+
+
+def scorecard_manifest(picture_file: str, size: tuple[int, int]) -> dict:
+    """Returns the manifest of the saved sizes of a picture.
+
+    The manifest only depends on the size of the uploaded picture, so it is 
+    known from the image header before the picture is processed.
+
+    Args:
+        picture_file (str): File name of the full size JPEG.
+        size (tuple[int, int]): Width and height of the uploaded picture.
+
+    Returns:
+        dict: Manifest with the fields ``file``, set to the full size JPEG, 
+        and ``derivatives``, a list of objects with the fields ``name``, 
+        ``format``, ``file``, ``width`` and ``height`` ordered from smallest 
+        to largest.
+    """
+
+    derivatives = []
+    for name, max_size in DERIVATIVES:
+        width, height = _fit(size, max_size)
+        for image_format, extension in DERIVATIVE_FORMATS:
+            derivatives.append({
+                "name": name, "format": image_format, 
+                "file": derivative_file(picture_file, name, extension), 
+                "width": width, "height": height
+            })
+
+    return {"file": picture_file, "derivatives": derivatives}
+
+
+def process_scorecard(source: str, directory: str, picture_file: str) -> dict:
+    """Saves every size and format of a scorecard picture.
+
+    JPEG pictures are decoded in draft mode at the smallest scale still
+    larger than the full size, which cuts decoding time and memory for large
+    photos. Each size is resized from the decoded picture. Files are written 
+    to a temporary file and renamed, so a partially written picture is never 
+    served.
+
+    Args:
+        source (str): Path of the uploaded picture.
+        directory (str): Directory to save the pictures in.
+        picture_file (str): File name of the full size JPEG.
+
+    Returns:
+        dict: Manifest of the saved pictures, see 
+        :py:func:`scorecard_manifest`.
+    """
+
+    with Image.open(source) as image:
+        manifest = scorecard_manifest(picture_file, image.size)
+        full_size = DERIVATIVES[-1][1]
+
+        if image.format == "JPEG":
+            image.draft("RGB", (full_size, full_size))
+        image = image.convert("RGB")
+
+        # Full size JPEG last, it marks the picture as processed
+        for derivative in manifest["derivatives"]:
+            path = os.path.join(directory, derivative["file"])
+            # Pictures saved before derivatives are already the full size 
+            # JPEG, don't encode them again
+            if os.path.abspath(path) == os.path.abspath(source):
+                continue
+
+            size = (derivative["width"], derivative["height"])
+            resized = image if image.size == size \
+                else image.resize(size, Image.LANCZOS)
+
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            resized.save(tmp_path, format=derivative["format"])
+            os.replace(tmp_path, path)
+
+    return manifest
+
+
+class ScorecardProcessor:
+    """Spools uploaded scorecard pictures and processes them in a bounded
+    thread pool.
+
+    Set the number of threads with ``SCORECARD_WORKERS``, the pictures 
+    directory with ``SCORECARD_PICS_DIR`` and the spool directory with 
+    ``SCORECARD_SPOOL_DIR`` in the Flask config. If
+    ``SCORECARD_WORKERS`` is ``0``, pictures are processed in the request.
+
+    Pictures are sent by :py:meth:`send_picture`, which hands the transfer to 
+    the front proxy when ``SCORECARD_SENDFILE`` is set.
+
+    Claimed uploads are named by the ID of the claiming process, so the 
+    spool directory must not be shared between hosts.
+    """
+
+    def __init__(self) -> None:
+        self.spool_dir: Optional[str] = None
+        self.pictures_dir: Optional[str] = None
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._logger = logging.getLogger(__name__)
+
+    def init_app(self, app: Flask) -> None:
+        self._logger = app.logger
+        self.pictures_dir = os.path.join(
+            app.config.get("SCORECARD_PICS_DIR") 
+            or os.path.join(app.instance_path, "scorecard_pics"),
+            os.path.basename(SCORECARD_PICS_INSTANCE_PATH)
+        )
+        self.spool_dir = app.config.get("SCORECARD_SPOOL_DIR") \
+            or os.path.join(
+                app.instance_path, "scorecard_spool",
+                os.path.basename(SCORECARD_PICS_INSTANCE_PATH)
+            )
+        os.makedirs(self.spool_dir, exist_ok=True)
+        os.makedirs(self.pictures_dir, exist_ok=True)
+
+        workers = app.config.get("SCORECARD_WORKERS", 2)
+        self._executor = ThreadPoolExecutor(
+            workers, thread_name_prefix="scorecard"
+        ) if workers > 0 else None
+
+        self._move_static_pictures(os.path.join(
+            app.root_path, "static", SCORECARD_PICS_INSTANCE_PATH
+        ))
+        self._shard_flat_pictures()
+        self._recover_stale_work()
+
+        # Finish uploads left over from a previous run
+        for name in os.listdir(self.spool_dir):
+            if name.endswith(_SPOOL_EXTENSION):
+                self._submit(name[:-len(_SPOOL_EXTENSION)])
+
+    def spool(self, stream: IO[bytes]) -> dict:
+        """Writes an uploaded picture to the spool directory and queues it
+        for processing.
+
+        Args:
+            stream (IO[bytes]): Uploaded file, already checked with
+                :py:func:`check_scorecard_header`.
+
+        Returns:
+            dict: Manifest of the pictures that will be saved, see 
+            :py:func:`scorecard_manifest`.
+        """
+
+        with Image.open(stream) as image:
+            size = image.size
+        stream.seek(0)
+
+        # The file is named once it is written and hashed
+        digest = hashlib.sha256()
+        tmp_path = os.path.join(
+            self.spool_dir, f"{os.getpid()}.{id(stream)}.tmp"
+        )
+        with open(tmp_path, "wb") as f:
+            while True:
+                chunk = stream.read(64 * 1024)
+                if not chunk:
+                    break
+                digest.update(chunk)
+                f.write(chunk)
+
+        picture_file = digest.hexdigest()[:_HASH_LENGTH] + ".jpg"
+        manifest = scorecard_manifest(picture_file, size)
+
+        # Identical upload, reuse the saved pictures
+        if self.is_processed(picture_file):
+            os.remove(tmp_path)
+            self._touch(picture_file)
+            return manifest
+
+        os.replace(tmp_path, self._spool_path(picture_file))
+        self._submit(picture_file)
+        return manifest
+
+    def is_processed(self, picture_file: str) -> bool:
+        """Returns True if the picture is processed and can be shown.
+        """
+
+        return os.path.isfile(self.picture_path(picture_file))
+
+    def is_failed(self, picture_file: str) -> bool:
+        """Returns True if the picture failed to process.
+        """
+
+        return os.path.isfile(self._failed_path(picture_file))
+
+    def failed_pictures(self) -> list[str]:
+        """Returns the file names of the pictures that failed to process.
+        """
+
+        return sorted(
+            name[:-len(_FAILED_EXTENSION)] 
+            for name in os.listdir(self.spool_dir) 
+            if name.endswith(_FAILED_EXTENSION)
+        )
+
+    def retry_failed(self) -> int:
+        """Queues the pictures that failed to process again.
+
+        Returns:
+            int: Number of pictures queued.
+        """
+
+        retried = 0
+        for picture_file in self.failed_pictures():
+            try:
+                os.rename(
+                    self._failed_path(picture_file), 
+                    self._spool_path(picture_file)
+                )
+            except FileNotFoundError:
+                # Retried by another process
+                continue
+
+            self._submit(picture_file)
+            retried += 1
+
+        return retried
+
+    def picture_path(self, picture_file: str) -> str:
+        return os.path.join(self.shard_dir(picture_file), picture_file)
+
+    def shard_dir(self, picture_file: str) -> str:
+        return os.path.join(self.pictures_dir, picture_shard(picture_file))
+
+    def relative_path(self, file_name: str) -> str:
+        """Returns the path of a picture relative to the parent of the 
+        pictures directory, which is set by ``SCORECARD_PICS_DIR``.
+        """
+
+        return os.path.join(
+            os.path.basename(self.pictures_dir), picture_shard(file_name), 
+            file_name
+        )
+
+    def picture_files(self, game: Game) -> set[str]:
+        """Returns the file names of every saved size of a game's picture.
+        """
+
+        if game.picture_file is None:
+            return set()
+        if game.picture_manifest is None:
+            return {game.picture_file}
+
+        return {d["file"] for d in game.picture_manifest["derivatives"]}
+
+    def picture_url(self, game: Game) -> str:
+        """Returns the URL of a game's picture, or of a placeholder while 
+        the picture is processed or if it failed to process.
+        """
+
+        if self.is_processed(game.picture_file):
+            return url_for(
+                'games.scorecard', game_id=game.id, 
+                file_name=game.picture_file
+            )
+        if self.is_failed(game.picture_file):
+            return url_for('static', filename=FAILED_STATIC_PATH)
+
+        return url_for('static', filename=PLACEHOLDER_STATIC_PATH)
+
+    def picture_srcsets(self, game: Game) -> Optional[dict]:
+        """Returns the ``srcset`` attribute of each format of a game's 
+        picture.
+
+        Args:
+            game (Game): Game of the picture.
+
+        Returns:
+            Optional[dict]: ``srcset`` keyed by image format, or None if the 
+            picture has no manifest or is not processed yet.
+        """
+
+        manifest = game.picture_manifest
+        if manifest is None or not self.is_processed(manifest["file"]):
+            return None
+
+        srcsets: dict[str, list[str]] = {}
+        for derivative in manifest["derivatives"]:
+            url = url_for(
+                'games.scorecard', game_id=game.id, 
+                file_name=derivative["file"]
+            )
+            srcsets.setdefault(derivative["format"], []) \
+                .append(f"{url} {derivative['width']}w")
+
+        return {k: ", ".join(v) for k, v in srcsets.items()}
+
+    def send_picture(self, file_name: str) -> Response:
+        """Returns a response sending a saved picture.
+
+        Depending on ``SCORECARD_SENDFILE`` in the Flask config, the file is 
+        sent by NGINX with an ``X-Accel-Redirect`` header, by Apache or 
+        Lighttpd with an ``X-Sendfile`` header, or streamed by Werkzeug with 
+        support for conditional and range requests. Responses can be cached 
+        by the browser forever.
+
+        Args:
+            file_name (str): Name of the saved file, already checked to 
+                belong to a game the user can see.
+
+        Returns:
+            Response: Picture response.
+        """
+
+        path = os.path.join(self.shard_dir(file_name), file_name)
+        mode = current_app.config.get("SCORECARD_SENDFILE")
+
+        if mode == "x-accel-redirect":
+            prefix = current_app.config["SCORECARD_ACCEL_PREFIX"].rstrip("/")
+            response = current_app.response_class(
+                mimetype=mimetypes.guess_type(file_name)[0]
+            )
+            response.headers["X-Accel-Redirect"] = \
+                f"{prefix}/{self.relative_path(file_name)}"
+        else:
+            response = send_file(
+                path, request.environ, conditional=True, 
+                use_x_sendfile=(mode == "x-sendfile"), 
+                response_class=current_app.response_class
+            )
+
+        response.cache_control.no_cache = None
+        response.cache_control.private = True
+        response.cache_control.max_age = PICTURE_MAX_AGE
+        response.cache_control.immutable = True
+        return response
+
+    def release(self, picture_file: Optional[str]) -> bool:
+        """Removes a picture and its derivatives if no game references it.
+
+        Call after the change removing the reference is committed. Pictures 
+        uploaded within :py:data:`ORPHAN_GRACE_PERIOD` are kept, since they 
+        may be about to be referenced by a game being submitted, and are 
+        left for :py:meth:`collect_garbage`.
+
+        Args:
+            picture_file (Optional[str]): File name of the full size JPEG.
+
+        Returns:
+            bool: True if the picture was removed.
+        """
+
+        if picture_file is None:
+            return False
+
+        references = db.session.scalar(
+            db.select(db.func.count()).where(
+                Game.picture_file == picture_file
+            )
+        )
+        if references > 0:
+            return False
+
+        names = [
+            name for name in self._list_shard(picture_shard(picture_file))
+            if _picture_base(name) == _picture_base(picture_file)
+        ]
+        return self._remove_orphans(picture_shard(picture_file), names) > 0
+
+    def collect_garbage(self, max_shards: Optional[int] = None) -> int:
+        """Removes pictures no game references.
+
+        Shards are scanned in order, continuing from where the last call 
+        stopped, so a large store can be cleaned a few shards at a time.
+
+        Args:
+            max_shards (Optional[int]): Maximum number of shards to scan. 
+                Scans every shard if not given.
+
+        Returns:
+            int: Number of files removed.
+        """
+
+        shards = sorted(
+            name for name in os.listdir(self.pictures_dir) 
+            if os.path.isdir(os.path.join(self.pictures_dir, name))
+        )
+        if len(shards) == 0:
+            return 0
+
+        cursor_path = os.path.join(self.spool_dir, _GC_CURSOR)
+        try:
+            with open(cursor_path) as f:
+                cursor = f.read().strip()
+        except FileNotFoundError:
+            cursor = ""
+
+        # Continue after the last scanned shard, wrapping around
+        start = next((i for i, s in enumerate(shards) if s > cursor), 0)
+        shards = shards[start:] + shards[:start]
+        if max_shards is not None:
+            shards = shards[:max_shards]
+
+        removed = 0
+        for shard in shards:
+            names = self._list_shard(shard)
+            bases = {_picture_base(name) for name in names}
+            referenced = set(db.session.scalars(
+                db.select(Game.picture_file).where(Game.picture_file.in_(
+                    [base + ".jpg" for base in bases]
+                ))
+            ))
+
+            orphans = [
+                name for name in names 
+                if _picture_base(name) + ".jpg" not in referenced
+            ]
+            removed += self._remove_orphans(shard, orphans)
+
+            with open(cursor_path, "w") as f:
+                f.write(shard)
+
+        return removed
+
+    def clear(self) -> None:
+        """Removes every picture.
+
+        The pictures directory is swapped for an empty one with a rename, 
+        and the old directory is deleted in the background.
+        """
+
+        trash = f"{self.pictures_dir}.{os.getpid()}.{time.time_ns()}.trash"
+        try:
+            os.rename(self.pictures_dir, trash)
+        except FileNotFoundError:
+            # Interrupted between the rename and creating the new directory
+            os.makedirs(self.pictures_dir, exist_ok=True)
+            return
+        os.makedirs(self.pictures_dir, exist_ok=True)
+
+        if self._executor is None:
+            shutil.rmtree(trash, ignore_errors=True)
+        else:
+            self._executor.submit(shutil.rmtree, trash, ignore_errors=True)
+
+    def _list_shard(self, shard: str) -> list[str]:
+        try:
+            return os.listdir(os.path.join(self.pictures_dir, shard))
+        except FileNotFoundError:
+            return []
+
+    def _remove_orphans(self, shard: str, names: list[str]) -> int:
+        """Removes files of a shard whose picture was not uploaded within the 
+        grace period.
+
+        Derivatives are kept or removed with their full size JPEG, which is 
+        touched whenever the picture is uploaded again.
+        """
+
+        shard_dir = os.path.join(self.pictures_dir, shard)
+        expired = time.time() - ORPHAN_GRACE_PERIOD
+        removed = 0
+        # Full size JPEGs last, their age decides for the derivatives
+        for name in sorted(names, key=lambda n: n.endswith(".jpg") 
+                           and "_" not in n):
+            path = os.path.join(shard_dir, name)
+            full_path = os.path.join(shard_dir, _picture_base(name) + ".jpg")
+            try:
+                if os.path.isfile(full_path):
+                    uploaded = os.path.getmtime(full_path)
+                else:
+                    uploaded = os.path.getmtime(path)
+
+                if uploaded < expired:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+
+        return removed
+
+    def _touch(self, picture_file: str) -> None:
+        """Restarts the grace period of a reused picture.
+        """
+
+        try:
+            os.utime(self.picture_path(picture_file))
+        except FileNotFoundError:
+            pass
+
+    def _move_static_pictures(self, static_dir: str) -> None:
+        """Moves pictures saved in the static folder, where they could be 
+        downloaded without checking access, to the pictures directory.
+        """
+
+        if os.path.isdir(static_dir) is False:
+            return
+
+        self._logger.warning(
+            "Moving scorecard pictures from %s to %s", static_dir, 
+            self.pictures_dir
+        )
+        for root, _, names in os.walk(static_dir):
+            directory = os.path.join(
+                self.pictures_dir, os.path.relpath(root, static_dir)
+            )
+            os.makedirs(directory, exist_ok=True)
+            for name in names:
+                try:
+                    shutil.move(
+                        os.path.join(root, name), 
+                        os.path.join(directory, name)
+                    )
+                except FileNotFoundError:
+                    # Moved by another process
+                    pass
+
+        shutil.rmtree(static_dir, ignore_errors=True)
+
+    def _shard_flat_pictures(self) -> None:
+        """Moves pictures saved before sharding into their shard.
+        """
+
+        for name in os.listdir(self.pictures_dir):
+            path = os.path.join(self.pictures_dir, name)
+            if os.path.isfile(path) is False:
+                continue
+
+            os.makedirs(self.shard_dir(name), exist_ok=True)
+            try:
+                os.rename(path, self.picture_path(name))
+            except FileNotFoundError:
+                pass
+
+    def _recover_stale_work(self) -> None:
+        """Puts uploads claimed by a process that is no longer running back 
+        in the spool.
+        """
+
+        for name in os.listdir(self.spool_dir):
+            if not name.endswith(_WORK_EXTENSION):
+                continue
+
+            spool_name, _, pid = name[:-len(_WORK_EXTENSION)].rpartition(".")
+            if not spool_name.endswith(_SPOOL_EXTENSION) \
+                    or not pid.isdigit():
+                continue
+            # Nothing is processed by this process yet, so its own claims 
+            # are left over from an earlier process with the same ID
+            if int(pid) != os.getpid() and _is_running(int(pid)):
+                continue
+
+            self._logger.warning(
+                "Retrying scorecard picture %s claimed by stopped process %s",
+                spool_name[:-len(_SPOOL_EXTENSION)], pid
+            )
+            try:
+                os.rename(
+                    os.path.join(self.spool_dir, name), 
+                    os.path.join(self.spool_dir, spool_name)
+                )
+            except FileNotFoundError:
+                # Recovered by another process
+                pass
+
+    def _spool_path(self, picture_file: str) -> str:
+        return os.path.join(self.spool_dir, picture_file + _SPOOL_EXTENSION)
+
+    def _failed_path(self, picture_file: str) -> str:
+        return os.path.join(self.spool_dir, picture_file + _FAILED_EXTENSION)
+
+    def _submit(self, picture_file: str) -> None:
+        if self._executor is None:
+            self._process(picture_file)
+            return
+
+        self._executor.submit(self._process, picture_file)
+
+    def _process(self, picture_file: str) -> None:
+        spool_path = self._spool_path(picture_file)
+        work_path = f"{spool_path}.{os.getpid()}{_WORK_EXTENSION}"
+
+        # Claim the upload, another process may have already taken it
+        try:
+            os.rename(spool_path, work_path)
+        except FileNotFoundError:
+            return
+
+        try:
+            os.makedirs(self.shard_dir(picture_file), exist_ok=True)
+            process_scorecard(
+                work_path, self.shard_dir(picture_file), picture_file
+            )
+        except Exception:
+            self._logger.exception(
+                "Failed to process scorecard picture %s", picture_file
+            )
+            # Keep the upload so it can be retried
+            os.replace(work_path, self._failed_path(picture_file))
+            return
+
+        os.remove(work_path)
+        # Uploaded again after failing
+        try:
+            os.remove(self._failed_path(picture_file))
+        except FileNotFoundError:
+            pass
+
+
+scorecards = ScorecardProcessor()
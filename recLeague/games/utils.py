@@ -1,16 +1,29 @@
-import os
-import secrets
-from typing import Iterable
+from __future__ import annotations
+from dataclasses import dataclass
+from datetime import datetime
+from itertools import chain
+from typing import Iterable, Optional, Sequence
 
-from PIL import Image
-from flask import current_app
+import numpy as np
 from flask_login import current_user
+from sqlalchemy import and_, or_, not_, case, func, bindparam
+from sqlalchemy.orm import aliased, joinedload, selectinload
+from sqlalchemy.orm.interfaces import LoaderOption
+from sqlalchemy.sql import ColumnElement, Select, Subquery
+from werkzeug.datastructures import FileStorage
 
 from recLeague import db
-from recLeague.models import Team, User, Stats, Game
+from recLeague.models import (
+    Team, User, Stats, Game, HeadToHead, team_game_table, player_game_table
+)
 from recLeague.games.forms import GameForm
+from recLeague.games.scorecards import scorecards
+from recLeague.stats.utils import (
+    STAT_COLUMNS, aggregate_stats, unpack_stats, load_player_stat_lines, 
+    stat_lines_query, refresh_leaderboard, update_leaderboard
+)
 from recLeague.config import (
-    SCORECARD_PICS_STATIC_PATH, STAT_CATEGORY_KEYS, NUM_TEAM_PLAYERS
+    STAT_CATEGORY_KEYS, NUM_TEAM_PLAYERS
 )
 
 
@@ -32,35 +45,88 @@ def is_game_user_modifiable(game: Game) -> bool:
             or (current_user in game.players and game.verified is False))
 
 
-def save_scorecard_picture(form_picture_filepath: str) -> str:
-    """Saves scorecard picture as jpeg file at the scorecard static path.
+def game_card_options() -> list[LoaderOption]:
+    """Returns the loader options for rendering games with 
+    ``game_card.html``.
+
+    Everything a game card shows is loaded with a fixed number of queries 
+    for any number of games, instead of lazily for each card. Apply to a game 
+    query with ``.options(*game_card_options())``, or to a games relationship 
+    with ``selectinload(Team.games).options(*game_card_options())``.
+
+    Returns:
+        list[LoaderOption]: Loader options for :py:class:`Game 
+        <recLeague.models.Game>` queries.
+    """
+
+    return [
+        selectinload(Game.teams).joinedload(Team.division),
+        selectinload(Game.players),
+        selectinload(Game.player_stats)
+    ]
+
+
+def head_to_head_games(team_1_id: int, team_2_id: int) -> Select:
+    """Returns a query for the games between two teams, latest first.
+
+    The team game table is joined to itself on the game, so both sides are 
+    found with the ``(team_id, game_id)`` index instead of walking the games 
+    of either team.
+
+    Args:
+        team_1_id (int): ID of team 1.
+        team_2_id (int): ID of team 2.
+
+    Returns:
+        Select: Query for rows of the game ID, the score of team 1 and the 
+        score of team 2.
+    """
+
+    t1 = team_game_table.alias("t1")
+    t2 = team_game_table.alias("t2")
+
+    is_team_1 = t1.c.position == 0
+    team_1_score = case((is_team_1, Game.team_1_score), 
+                        else_=Game.team_2_score)
+    team_2_score = case((is_team_1, Game.team_2_score), 
+                        else_=Game.team_1_score)
+
+    return db.select(
+        Game.id, team_1_score.label("team_1_score"), 
+        team_2_score.label("team_2_score")
+    ).select_from(t1) \
+        .join(t2, and_(
+            t2.c.game_id == t1.c.game_id, t2.c.team_id == team_2_id
+        )) \
+        .join(Game, Game.id == t1.c.game_id) \
+        .where(t1.c.team_id == team_1_id) \
+        .order_by(Game.date_posted.desc(), Game.id.desc())
+
+
+def save_scorecard_picture(form_picture: FileStorage) -> dict:
+    """Saves scorecard picture in several sizes as WebP and JPEG files in 
+    the scorecard pictures directory.
+
+    The upload is only spooled here, it is resized and saved in the 
+    background by :py:data:`scorecards 
+    <recLeague.games.scorecards.scorecards>`.
     
     .. note::
 
-        See :py:data:`SCORECARD_PICS_STATIC_PATH 
-        <recLeague.config.SCORECARD_PICS_STATIC_PATH>` for information about 
+        See :py:data:`SCORECARD_PICS_INSTANCE_PATH 
+        <recLeague.config.SCORECARD_PICS_INSTANCE_PATH>` for information about 
         the save path.
     
     Args:
-        form_picture_filepath (str): Filepath of picture to save.
+        form_picture (FileStorage): Uploaded picture to save.
     
     Returns:
-        str: Filepath of saved image file.
+        dict: Manifest of the pictures that will be saved, see 
+        :py:func:`scorecard_manifest 
+        <recLeague.games.scorecards.scorecard_manifest>`.
     """
 
-    random_hex = secrets.token_hex(8)
-    picture_fn = random_hex + ".jpg"
-    picture_path = os.path.join(
-        current_app.root_path, "static", SCORECARD_PICS_STATIC_PATH, picture_fn
-    )
-
-    output_size = (1080, 1080)
-    i = Image.open(form_picture_filepath)
-    i = i.convert('RGB')
-    i.thumbnail(output_size)
-    i.save(picture_path, format="jpeg")
-
-    return picture_fn
+    return scorecards.spool(form_picture.stream)
 
 
 def set_game(form: GameForm, game: Game) -> None:
@@ -72,9 +138,9 @@ def set_game(form: GameForm, game: Game) -> None:
     """     
 
     if form.picture.data is not None:
-        game.picture_file = save_scorecard_picture(form.picture.data)
-        # TODO: Optimization, delete old picture_file 
-        # if not none to save storage
+        manifest = save_scorecard_picture(form.picture.data)
+        game.picture_file = manifest["file"]
+        game.picture_manifest = manifest
     
     game.team_1_score = form.team_1_score.data
     game.team_2_score = form.team_2_score.data
@@ -121,56 +187,199 @@ def set_game(form: GameForm, game: Game) -> None:
 
     game.is_sub = is_sub
 
+    # Store the team and player order so it can be used in queries
+    db.session.flush()
+    db.session.execute(
+        team_game_table.update()
+        .where(
+            team_game_table.c.game_id == game.id, 
+            team_game_table.c.team_id == game.teams[1].id
+        )
+        .values(position=1)
+    )
+    db.session.execute(
+        player_game_table.update()
+        .where(
+            player_game_table.c.game_id == game.id, 
+            player_game_table.c.player_id == bindparam("b_player_id")
+        )
+        .values(position=bindparam("b_position")),
+        [
+            {"b_player_id": p.id, "b_position": i} 
+            for i, p in enumerate(game.players)
+        ]
+    )
+
+
+def _new_stats() -> Stats:
+    stats = Stats()
+    stats.set_stats([0]*len(STAT_CATEGORY_KEYS), 0)
+    return stats
+
+
+def _team_results(team_ids: Optional[Sequence[int]] = None) -> Subquery:
+    """Returns a subquery with a row for each team in every verified game.
+    
+    Each row has the team's result in the game, the score differential from 
+    the team's side, whether the game was divisional, the game's place in 
+    the team's history counting back from the latest game, and the result of 
+    the team's latest game.
+
+    Args:
+        team_ids (Optional[Sequence[int]]): If given, only rows for these 
+            teams are included.
+    
+    Returns:
+        Subquery: Team game results.
+    """
+
+    tg = team_game_table.alias("tg")
+    opp = team_game_table.alias("opp")
+    team = aliased(Team)
+    opp_team = aliased(Team)
+
+    is_team_1 = tg.c.position == 0
+    team_1_won = Game.team_1_score >= Game.team_2_score
+    won = case(
+        (and_(is_team_1, team_1_won), 1), 
+        (and_(not_(is_team_1), not_(team_1_won)), 1), 
+        else_=0
+    )
+    score_diff = case(
+        (is_team_1, Game.team_1_score - Game.team_2_score), 
+        else_=Game.team_2_score - Game.team_1_score
+    )
+    divisional = case((team.division_id == opp_team.division_id, 1), else_=0)
+
+    latest_first = {
+        "partition_by": tg.c.team_id, 
+        "order_by": (Game.date_posted.desc(), Game.id.desc())
+    }
+
+    results = db.select(
+        tg.c.team_id.label("team_id"), 
+        won.label("won"), 
+        score_diff.label("score_diff"), 
+        divisional.label("divisional"), 
+        func.row_number().over(**latest_first).label("games_ago"),
+        func.first_value(won).over(**latest_first).label("last_won")
+    ).select_from(tg) \
+        .join(Game, Game.id == tg.c.game_id) \
+        .join(opp, and_(
+            opp.c.game_id == tg.c.game_id, opp.c.team_id != tg.c.team_id
+        )) \
+        .join(team, team.id == tg.c.team_id) \
+        .join(opp_team, opp_team.id == opp.c.team_id) \
+        .where(Game.verified)
+
+    if team_ids is not None:
+        results = results.where(tg.c.team_id.in_(team_ids))
+
+    return results.subquery("team_results")
+
+
+def _streak_column(results: Subquery) -> ColumnElement:
+    """Returns the aggregate for the length of a team's current streak.
+    
+    The streak is the number of latest games with the same result as the 
+    last game, which is one less than how many games ago the result first 
+    changed.
+    """
+
+    first_change = func.min(case(
+        (results.c.won != results.c.last_won, results.c.games_ago)
+    ))
+    return func.coalesce(first_change - 1, func.count())
 
-def calculate_team_stats(teams: Iterable[Team]) -> None:
+
+def _write_team_stats(rows: list[dict]) -> None:
+    """Writes team stats with one bulk UPDATE and expires the stale values 
+    of loaded teams.
+    """
+
+    if len(rows) == 0:
+        return
+
+    db.session.execute(db.update(Team), rows)
+
+    keys = [k for k in rows[0] if k != "id"]
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Team):
+            db.session.expire(obj, keys)
+
+
+def calculate_team_stats(teams: Optional[Iterable[Team]] = None) -> None:
     """ Calculates the running total of current season stats for teams.
     
+    All records are computed with a single grouped query over the team game 
+    table and written back with one bulk update, so the number of queries 
+    does not grow with the number of teams or games.
+
     Args:
-        teams (Iterable[Team]): List of teams to calcuate stats
+        teams (Optional[Iterable[Team]]): List of teams to calcuate stats. 
+            Calculates stats for all teams if not given.
     """
 
-    # Loop through all teams
-    for team in teams:
-        wins = 0
-        losses = 0
-        
-        div_wins = 0
-        div_losses = 0
-
-        streak = 0
-        score_diff = 0
-
-        # Loop through all games in teams season
-        for game in team.games:
-            if game.verified:
-                divisional = (
-                    game.teams[0].division is not None 
-                    and game.teams[1].division is not None 
-                    and (game.teams[0].division.id == game.teams[1].division.id)
-                )
-
-                # Check if this team won the game
-                if (game.teams.index(team) == 0) == (game.did_team_1_win()):
-                    wins += 1
-                    if divisional:
-                        div_wins += 1
-                    streak = streak + 1 if streak >= 0 else 1
-                else:
-                    losses += 1
-                    if divisional:
-                        div_losses += 1
-                    streak = streak - 1 if streak <= 0 else -1
+    if teams is None:
+        team_ids = list(db.session.scalars(db.select(Team.id)))
+        results = _team_results()
+    else:
+        team_ids = [t.id for t in teams]
+        results = _team_results(team_ids)
+
+    r = results.c
+    query = db.select(
+        r.team_id, 
+        func.count(), 
+        func.sum(r.won), 
+        func.sum(r.won * r.divisional), 
+        func.sum((1 - r.won) * r.divisional), 
+        func.sum(r.score_diff), 
+        func.max(r.last_won),
+        _streak_column(results)
+    ).group_by(r.team_id)
+
+    # Teams without verified games are reset to an empty record
+    team_stats = {
+        i: {
+            "id": i, "wins": 0, "losses": 0, "games_played": 0, 
+            "div_wins": 0, "div_losses": 0, "streak": 0, "score_diff": 0
+        } 
+        for i in team_ids
+    }
+    for (team_id, games, wins, div_wins, div_losses, score_diff, last_won, 
+            streak) in db.session.execute(query):
+        team_stats[team_id].update(
+            wins=wins, losses=games - wins, games_played=games, 
+            div_wins=div_wins, div_losses=div_losses, score_diff=score_diff, 
+            streak=(streak if last_won else -streak)
+        )
+
+    _write_team_stats(list(team_stats.values()))
+
+
+def calculate_team_streaks(teams: Iterable[Team]) -> None:
+    """ Recalculates only the current streak of teams.
+    
+    Args:
+        teams (Iterable[Team]): List of teams to calcuate streaks
+    """
 
-                diff = game.team_1_score - game.team_2_score
-                score_diff += (diff if game.teams.index(team) == 0 else -diff)
+    team_ids = [t.id for t in teams]
+    if len(team_ids) == 0:
+        return
 
-        # Set team stats
-        team.wins = wins
-        team.losses = losses
-        team.div_wins = div_wins
-        team.div_losses = div_losses
-        team.streak = streak
-        team.score_diff = score_diff
+    results = _team_results(team_ids)
+    query = db.select(
+        results.c.team_id, func.max(results.c.last_won), 
+        _streak_column(results)
+    ).group_by(results.c.team_id)
+
+    streaks = {i: 0 for i in team_ids}
+    for team_id, last_won, streak in db.session.execute(query):
+        streaks[team_id] = streak if last_won else -streak
+
+    _write_team_stats([{"id": i, "streak": s} for i, s in streaks.items()])
 
 
 def calculate_player_stats(players: Iterable[User]) -> None:
@@ -184,33 +393,131 @@ def calculate_player_stats(players: Iterable[User]) -> None:
         # Init stat data if set to None
         if player.season_stats is None:
             player.season_stats = Stats()
-        else:
-            # TODO: Replace with config NUM_STATS
-            player.season_stats.set_stats(
-                [0]*len(STAT_CATEGORY_KEYS), 0
-            )
+        if player.season_high_stats is None:
+            player.season_high_stats = Stats()
+
+        agg = aggregate_stats(load_player_stat_lines(player))
+        unpack_stats(agg.sums, player.season_stats)
+        unpack_stats(agg.maxima, player.season_high_stats)
+
+
+def calculate_player_high_stats(players: Iterable[User]) -> None:
+    """ Recalculates only the single game highs of the current season for 
+    players.
+    
+    Args:
+        players (Iterable[Player]): List of players to calcuate highs
+    """
 
+    for player in players:
         if player.season_high_stats is None:
             player.season_high_stats = Stats()
-        else:
-            player.season_high_stats.set_stats(
-                [0]*len(STAT_CATEGORY_KEYS), 0
-            )
-        
-        # Loop through all players current season games
-        for game in player.games:
-            if game.verified:
-                player.season_stats.add_stats(
-                    game.player_stats[game.players.index(player)]
-                )
-                player.season_high_stats.max_stats(
-                    game.player_stats[game.players.index(player)]
-                )
+
+        agg = aggregate_stats(load_player_stat_lines(player))
+        unpack_stats(agg.maxima, player.season_high_stats)
+
+
+def rebuild_player_stats(batch_size: int = 5000) -> int:
+    """Rebuilds the current season stats and highs of every player from the 
+    game stat lines.
+
+    Stat lines are streamed from the database in batches and summed into 
+    arrays, so no games or users are loaded into the ORM. Results are 
+    written back with executemany updates.
+
+    Args:
+        batch_size (int): Number of stat lines read from the database at a 
+            time.
+    
+    Returns:
+        int: Number of stat lines read.
+    """
+
+    num_columns = len(STAT_COLUMNS)
+    # Sorted IDs of the players seen so far, row i of the arrays is player i
+    player_ids = np.zeros(0, dtype=np.int64)
+    sums = np.zeros((0, num_columns), dtype=np.int64)
+    highs = np.zeros((0, num_columns), dtype=np.int64)
+    num_lines = 0
+
+    result = db.session.execute(
+        stat_lines_query(), 
+        execution_options={"stream_results": True, "yield_per": batch_size}
+    )
+    for batch in result.partitions():
+        lines = np.array(batch, dtype=np.int64)
+        num_lines += len(lines)
+
+        # Grow the arrays for players seen for the first time, keeping the 
+        # rows in player ID order
+        all_ids = np.union1d(player_ids, lines[:, 0])
+        if len(all_ids) > len(player_ids):
+            old_rows = np.searchsorted(all_ids, player_ids)
+            grown = np.zeros((len(all_ids), num_columns), dtype=np.int64)
+            grown[old_rows] = sums
+            sums = grown
+            grown = np.zeros((len(all_ids), num_columns), dtype=np.int64)
+            grown[old_rows] = highs
+            highs = grown
+            player_ids = all_ids
+
+        rows = np.searchsorted(player_ids, lines[:, 0])
+        np.add.at(sums, rows, lines[:, 1:])
+        np.maximum.at(highs, rows, lines[:, 1:])
+
+    player_rows = {int(i): row for row, i in enumerate(player_ids)}
+
+    # Players need stat rows before they can be updated in bulk
+    missing = User.query.filter(
+        User.id.in_(list(player_rows)), 
+        or_(User.season_stats_id.is_(None), 
+            User.season_high_stats_id.is_(None))
+    )
+    for player in missing:
+        if player.season_stats is None:
+            player.season_stats = _new_stats()
+        if player.season_high_stats is None:
+            player.season_high_stats = _new_stats()
+    db.session.flush()
+
+    keys = STAT_COLUMNS
+    params = ["b_" + k for k in keys]
+    empty = [0] * len(keys)
+    updates = []
+    for user_id, season_id, high_id in db.session.execute(db.select(
+            User.id, User.season_stats_id, User.season_high_stats_id)):
+        row = player_rows.get(user_id)
+        season_vals = empty if row is None else sums[row].tolist()
+        high_vals = empty if row is None else highs[row].tolist()
+
+        if season_id is not None:
+            updates.append(dict(zip(params, season_vals), b_id=season_id))
+        if high_id is not None:
+            updates.append(dict(zip(params, high_vals), b_id=high_id))
+
+    if len(updates) > 0:
+        db.session.execute(
+            Stats.__table__.update()
+            .where(Stats.id == bindparam("b_id"))
+            .values({k: bindparam(p) for k, p in zip(keys, params)}),
+            updates
+        )
+
+    # Loaded stats are stale after the bulk update
+    for obj in list(db.session.identity_map.values()):
+        if isinstance(obj, Stats):
+            db.session.expire(obj, keys)
+
+    return num_lines
 
 
 def calculate_stats(teams: Iterable[Team], players: Iterable[User]) -> None:
     """ Calculates the running total of current season stats for teams 
     and players.
+
+    This walks every game the teams and players have played, so it is the 
+    fallback for repairing stats. Use :py:func:`update_season_stats` when 
+    only a few games changed.
     
     Args:
         teams (Iterable[Team]): List of teams to calcuate stats
@@ -219,3 +526,225 @@ def calculate_stats(teams: Iterable[Team], players: Iterable[User]) -> None:
 
     calculate_team_stats(teams)
     calculate_player_stats(players)
+    calculate_head_to_head()
+    refresh_leaderboard()
+
+
+@dataclass
+class GameResult:
+    """Snapshot of what a verified game adds to the season stats.
+    
+    The snapshot is taken before a game is edited or deleted, so its effect 
+    can still be removed after the game row has changed.
+
+    Attributes:
+        game_id: ID of the game.
+        date_posted: Date the game was posted.
+        teams: Teams in the game, team 1 first.
+        team_1_score: 
+        team_2_score: 
+        divisional: True if both teams are in the same division.
+        players: Players in the game, in the same order as player_stats.
+        player_stats: Detached copies of the game stat lines.
+    """
+    game_id: int
+    date_posted: datetime
+    teams: list[Team]
+    team_1_score: int
+    team_2_score: int
+    divisional: bool
+    players: list[User]
+    player_stats: list[Stats]
+
+    @classmethod
+    def from_game(cls, game: Game) -> GameResult:
+        divisions = [t.division_id for t in game.teams]
+        
+        return cls(
+            game_id=game.id, date_posted=game.date_posted, 
+            teams=list(game.teams), team_1_score=game.team_1_score, 
+            team_2_score=game.team_2_score, 
+            divisional=(divisions[0] is not None 
+                        and divisions[0] == divisions[1]),
+            players=list(game.players), 
+            player_stats=[s.copy() for s in game.player_stats]
+        )
+
+    def did_team_win(self, team_index: int) -> bool:
+        return (team_index == 0) == (self.team_1_score >= self.team_2_score)
+
+
+def _is_latest_team_game(team: Team, result: GameResult) -> bool:
+    """Returns True if no verified game of the team was posted after the 
+    result's game.
+    """
+
+    later_game = db.session.query(Game.id).join(team_game_table).filter(
+        team_game_table.c.team_id == team.id, 
+        Game.verified, 
+        Game.id != result.game_id,
+        or_(
+            Game.date_posted > result.date_posted, 
+            and_(Game.date_posted == result.date_posted, 
+                 Game.id > result.game_id)
+        )
+    ).first()
+
+    return later_game is None
+
+
+def update_season_stats(removed: Sequence[GameResult] = (), 
+                        added: Sequence[GameResult] = ()) -> None:
+    """Updates team and player season stats by the change of a few games.
+    
+    Wins, losses, score differential and stat totals are adjusted by each 
+    game's result instead of walking every game of the season. Streaks and 
+    single game highs are only recalculated when a removed game could have 
+    set them, or when an added game was not the team's latest game.
+
+    The database must already hold the final state of the games, i.e. 
+    removed games deleted or edited and added games verified.
+
+    Args:
+        removed (Sequence[GameResult]): Results to take out of the stats.
+        added (Sequence[GameResult]): Results to add to the stats.
+    """
+
+    stale_streaks: set[Team] = set()
+    stale_highs: set[User] = set()
+
+    for result in removed:
+        _apply_team_result(result, -1)
+        stale_streaks.update(result.teams)
+
+        for player, line in zip(result.players, result.player_stats):
+            if player.season_stats is None:
+                continue
+
+            player.season_stats.add_stats(line, -1)
+
+            # Highs only change if the removed line matched one of them
+            highs = player.season_high_stats
+            if (highs is None or player.season_stats.game_count <= 0 
+                    or any(v > 0 and v >= h for v, h in zip(
+                        line.get_stats(), highs.get_stats()))):
+                stale_highs.add(player)
+
+    for result in added:
+        _apply_team_result(result, 1)
+
+        for i, team in enumerate(result.teams):
+            if team in stale_streaks:
+                continue
+
+            if _is_latest_team_game(team, result):
+                if result.did_team_win(i):
+                    team.streak = team.streak + 1 if team.streak >= 0 else 1
+                else:
+                    team.streak = team.streak - 1 if team.streak <= 0 else -1
+            else:
+                stale_streaks.add(team)
+
+        for player, line in zip(result.players, result.player_stats):
+            if player.season_stats is None:
+                player.season_stats = _new_stats()
+            if player.season_high_stats is None:
+                player.season_high_stats = _new_stats()
+
+            player.season_stats.add_stats(line)
+            player.season_high_stats.max_stats(line)
+
+    calculate_team_streaks(stale_streaks)
+    calculate_player_high_stats(stale_highs)
+    calculate_head_to_head({
+        tuple(sorted(t.id for t in result.teams)) 
+        for result in chain(removed, added)
+    })
+    update_leaderboard({
+        player for result in chain(removed, added) 
+        for player in result.players
+    })
+
+
+def _apply_team_result(result: GameResult, sign: int) -> None:
+    diff = result.team_1_score - result.team_2_score
+
+    for i, team in enumerate(result.teams):
+        if result.did_team_win(i):
+            team.wins += sign
+            if result.divisional:
+                team.div_wins += sign
+        else:
+            team.losses += sign
+            if result.divisional:
+                team.div_losses += sign
+
+        team.games_played += sign
+        team.score_diff += sign * (diff if i == 0 else -diff)
+
+
+def calculate_head_to_head(
+        pairs: Optional[Iterable[tuple[int, int]]] = None) -> None:
+    """Rebuilds the :py:class:`HeadToHead <recLeague.models.HeadToHead>` 
+    records of pairs of teams from their verified games.
+
+    The games of all pairs are read with one query, oldest first, and the 
+    records are replaced.
+
+    Args:
+        pairs (Optional[Iterable[tuple[int, int]]]): Pairs of team IDs, 
+            lower ID first, to rebuild. Rebuilds every pair if not given.
+    """
+
+    t1 = team_game_table.alias("t1")
+    t2 = team_game_table.alias("t2")
+    query = db.select(
+        t1.c.team_id, t2.c.team_id, Game.id, Game.team_1_score, 
+        Game.team_2_score
+    ).select_from(Game) \
+        .join(t1, and_(t1.c.game_id == Game.id, t1.c.position == 0)) \
+        .join(t2, and_(t2.c.game_id == Game.id, t2.c.position == 1)) \
+        .where(Game.verified) \
+        .order_by(Game.date_posted, Game.id)
+    stale = db.delete(HeadToHead)
+
+    if pairs is not None:
+        pairs = list(pairs)
+        if len(pairs) == 0:
+            return
+
+        query = query.where(or_(*(
+            or_(and_(t1.c.team_id == low, t2.c.team_id == high), 
+                and_(t1.c.team_id == high, t2.c.team_id == low))
+            for low, high in pairs
+        )))
+        stale = stale.where(or_(*(
+            and_(HeadToHead.team_1_id == low, HeadToHead.team_2_id == high)
+            for low, high in pairs
+        )))
+
+    records: dict[tuple[int, int], dict] = {}
+    for team_1_id, team_2_id, game_id, score_1, score_2 in \
+            db.session.execute(query):
+        # Store the scores from the side of the team with the lower ID
+        if team_1_id > team_2_id:
+            team_1_id, team_2_id = team_2_id, team_1_id
+            score_1, score_2 = score_2, score_1
+            team_1_won = score_1 > score_2
+        else:
+            team_1_won = score_1 >= score_2
+
+        record = records.setdefault((team_1_id, team_2_id), {
+            "team_1_id": team_1_id, "team_2_id": team_2_id, "games": 0, 
+            "team_1_wins": 0, "team_2_wins": 0
+        })
+        record["games"] += 1
+        record["team_1_wins" if team_1_won else "team_2_wins"] += 1
+        record.update(
+            last_game_id=game_id, last_team_1_score=score_1, 
+            last_team_2_score=score_2
+        )
+
+    db.session.execute(stale)
+    if len(records) > 0:
+        db.session.execute(db.insert(HeadToHead), list(records.values()))
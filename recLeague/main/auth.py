@@ -0,0 +1,98 @@
+""" Fast path for the NGINX ``/auth`` subrequest.
+
+NGINX checks ``/auth`` for every protected static file, so image heavy pages
+make dozens of these requests. They are answered here before Flask
+dispatches the request.
+"""
+
+from __future__ import annotations
+from typing import Iterable, Optional
+
+from flask import Flask
+from flask_login.config import COOKIE_NAME
+from flask_login.utils import decode_cookie
+from itsdangerous import BadSignature
+from werkzeug.http import parse_cookie
+
+from recLeague.users.utils import get_allowed_user_ids
+
+
+class AuthFastPath:
+    """WSGI middleware answering ``/auth`` without a Flask request.
+
+    Gives the same answer as :py:func:`is_authenticated
+    <recLeague.main.routes.is_authenticated>`, and also rejects banned users.
+    The user ID is read from the signed session cookie, or the remember me
+    cookie, and checked against the cached set of users who exist and are not
+    banned. No database query is made except to reload the set once it
+    expires or a new user is seen.
+
+    Args:
+        app (Flask): Application to read the keys and cookie settings from.
+        wsgi_app: WSGI application handling every other request.
+        path (str): Path to answer.
+    """
+
+    def __init__(self, app: Flask, wsgi_app, path: str = "/auth") -> None:
+        self.app = app
+        self.wsgi_app = wsgi_app
+        self.path = path
+        self._serializer = None
+
+    def __call__(self, environ: dict, start_response) -> Iterable[bytes]:
+        if environ.get("PATH_INFO") != self.path:
+            return self.wsgi_app(environ, start_response)
+
+        if self.is_authenticated(environ):
+            status = "200 OK"
+        else:
+            status = "401 UNAUTHORIZED"
+
+        start_response(status, [("Content-Length", "0")])
+        return [b""]
+
+    def is_authenticated(self, environ: dict) -> bool:
+        """Returns True if the request is from a logged in user who still
+        exists and is not banned.
+        """
+
+        user_id = self.get_user_id(environ)
+        if user_id is None:
+            return False
+
+        with self.app.app_context():
+            return user_id in get_allowed_user_ids(user_id)
+
+    def get_user_id(self, environ: dict) -> Optional[str]:
+        """Returns the ID of the logged in user like Flask-Login, or None.
+        """
+
+        config = self.app.config
+        cookies = parse_cookie(environ)
+
+        session = self._load_session(
+            cookies.get(config["SESSION_COOKIE_NAME"])
+        )
+        user_id = session.get("_user_id")
+        if user_id is not None:
+            return str(user_id)
+
+        remember = cookies.get(config.get("REMEMBER_COOKIE_NAME", COOKIE_NAME))
+        if remember is not None and session.get("_remember") != "clear":
+            return decode_cookie(remember, key=self.app.secret_key)
+
+        return None
+
+    def _load_session(self, cookie: Optional[str]) -> dict:
+        if cookie is None:
+            return {}
+
+        if self._serializer is None:
+            self._serializer = self.app.session_interface \
+                .get_signing_serializer(self.app)
+
+        max_age = int(self.app.permanent_session_lifetime.total_seconds())
+        try:
+            return self._serializer.loads(cookie, max_age=max_age)
+        except BadSignature:
+            return {}
@@ -7,7 +7,9 @@ from flask_login import current_user, logout_user
 from recLeague.config import (
     BRANDING, APPEARANCE, STAT_HIGHLIGHT, LEAGUE_NAME
 )
-from recLeague.models import Game, Season, User, Team
+from recLeague.models import Game, User, Team
+from recLeague.main.utils import get_current_season
+from recLeague.games.utils import game_card_options
 
 main = Blueprint('main', __name__)
 
@@ -18,8 +20,8 @@ def home() -> ResponseReturnValue:
     """ Home page route - displays all games by date descending """
     page = request.args.get('page', 1, type=int)
     
-    games = Game.query.order_by(Game.date_posted.desc()) \
-        .paginate(page=page, per_page=20)
+    games = Game.query.options(*game_card_options()) \
+        .order_by(Game.date_posted.desc()).paginate(page=page, per_page=20)
     # current_user.last_active = datetime.utcnow()
 
     return render_template(
@@ -57,12 +59,14 @@ public_routes = [
 def is_authenticated() -> ResponseReturnValue:
     """Indicates whether the user is currently logged in.
     
-    Method is used by NGINX for authorized static routes.
+    Method is used by NGINX for authorized static routes. Requests are 
+    normally answered by :py:class:`AuthFastPath 
+    <recLeague.main.auth.AuthFastPath>` before reaching this route.
 
     :statuscode 200: User is logged in.
-    :statuscode 401: User is not logged in.
+    :statuscode 401: User is not logged in or is banned.
     """
-    if current_user.is_authenticated:
+    if current_user.is_authenticated and current_user.is_banned is False:
         return "", 200
 
     abort(401)
@@ -105,7 +109,7 @@ def inject_data():
 
     # User is authenticated so pass in season data to be used in the 
     # navbar in layout.html
-    season = Season.query.first()
+    season = get_current_season()
     return dict(
         season=season, branding=BRANDING, appearance=APPEARANCE, 
         league_name=LEAGUE_NAME
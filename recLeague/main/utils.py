@@ -0,0 +1,49 @@
+from __future__ import annotations
+from typing import Optional
+
+from recLeague import db
+from recLeague.cache import LRUCache
+from recLeague.models import Season
+
+
+season_cache = LRUCache(max_size=1, ttl=60)
+""" Per-process cache of the current season.
+
+    The TTL is set from ``SEASON_CACHE_TTL`` in the Flask config.
+"""
+
+_NO_SEASON = object()
+
+
+def get_current_season() -> Optional[Season]:
+    """Returns the current season, cached by the process.
+
+    The returned season is a copy that is not in the database session, so it 
+    is only for reading. Its date checks like :py:meth:`Season.is_active 
+    <recLeague.models.Season.is_active>` are evaluated on every call. Query 
+    the season to change it.
+
+    Returns:
+        Optional[Season]: Current season, or None if there is no season.
+    """
+
+    season = season_cache.get("season")
+    if season is None:
+        row = db.session.scalars(db.select(Season).limit(1)).first()
+        season = _NO_SEASON if row is None else Season(
+            id=row.id, name=row.name, date_start=row.date_start, 
+            date_end=row.date_end, is_archived=row.is_archived
+        )
+        season_cache.set("season", season)
+
+    return None if season is _NO_SEASON else season
+
+
+def forget_current_season() -> None:
+    """Removes the current season from the cache.
+    
+    Call after creating, changing or deleting the season. Other processes 
+    reload the season once their cached copy expires.
+    """
+
+    season_cache.clear()
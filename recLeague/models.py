@@ -9,12 +9,14 @@ from itsdangerous import URLSafeTimedSerializer as Serializer
 from itsdangerous.exc import BadSignature
 from flask import current_app
 from flask_login import UserMixin
-from sqlalchemy.sql.expression import func, cast
+from sqlalchemy.sql.expression import func, cast, case, and_
+from sqlalchemy.sql import ColumnElement
 from sqlalchemy.ext.hybrid import hybrid_method
+from sqlalchemy.orm import aliased, Query
 from sqlalchemy import or_
 from sqlalchemy.ext.declarative import DeclarativeMeta
 
-from recLeague import db, login_manager
+from recLeague import db
 from recLeague.config import (
     STAT_CATEGORY_KEYS, NUM_TEAM_PLAYERS
 )
@@ -31,11 +33,6 @@ from recLeague.config import (
 BaseModel: DeclarativeMeta = db.Model
 
 
-@login_manager.user_loader
-def load_user(user_id):
-    return User.query.get(int(user_id))
-
-
 player_game_table = db.Table(
     'player_game_table',
     db.Column(
@@ -43,7 +40,11 @@ player_game_table = db.Table(
     ),
     db.Column(
         'player_id', db.Integer, db.ForeignKey('user.id', ondelete="CASCADE")
-    )
+    ),
+    # Index of the player in the game, matches the order of the game stats
+    db.Column('position', db.Integer, nullable=False, default=0),
+    # Finds the games of a player without scanning the table
+    db.Index('ix_player_game_player', 'player_id', 'game_id')
 )
 
 team_game_table = db.Table(
@@ -53,21 +54,31 @@ team_game_table = db.Table(
     ),
     db.Column(
         'team_id', db.Integer, db.ForeignKey('team.id', ondelete="CASCADE")
-    )
+    ),
+    # Index of the team in the game, 0 for team 1 and 1 for team 2
+    db.Column('position', db.Integer, nullable=False, default=0),
+    # Finds the games of a team without scanning the table
+    db.Index('ix_team_game_team', 'team_id', 'game_id')
 )
 
 
 # Ideal statistics format would be array of integers stored as a single
 # variable. Arrays are not supported with the database type. Need to switch to 
 # Postgress if want arrays.
-def init_stats(cls):
+def init_stats(cls, prefix: str = ""):
     for stat in STAT_CATEGORY_KEYS:
         setattr(
-            cls, stat, db.Column(stat, db.Integer, nullable=False, default=0)
+            cls, prefix + stat, 
+            db.Column(prefix + stat, db.Integer, nullable=False, default=0)
         )
 
 
 class Stats(BaseModel):
+    __table_args__ = (
+        # Stat lines of a player's games are looked up by game
+        db.Index('ix_stats_game', 'game_id', 'id'),
+    )
+
     id = db.Column(db.Integer, primary_key=True)
 
     # _stat_keys: Sequence[str]
@@ -83,13 +94,24 @@ class Stats(BaseModel):
         
         self.game_count = game_count
 
-    def add_stats(self, other_stats: Stats) -> None:
+    def add_stats(self, other_stats: Stats, sign: int = 1) -> None:
         for stat in STAT_CATEGORY_KEYS:
             setattr(
-                self, stat, getattr(self, stat) + getattr(other_stats, stat)
+                self, stat, 
+                getattr(self, stat) + sign * getattr(other_stats, stat)
             )
         
-        self.game_count += other_stats.game_count
+        self.game_count += sign * other_stats.game_count
+
+    def copy(self) -> Stats:
+        """Returns a detached copy of the stat values.
+        
+        The copy is not added to the session, so it can be kept as a snapshot 
+        while the original row is edited or deleted.
+        """
+        stats = Stats()
+        stats.set_stats(self.get_stats(), self.game_count)
+        return stats
 
     def max_stats(self, other_stats: Stats) -> None:
         if other_stats is None:
@@ -122,6 +144,15 @@ class User(BaseModel, UserMixin):
     )
     # last_active = db.Column(db.DateTime)
 
+    # Trophy counts of archived seasons, kept with the championship tables so
+    # display names don't need to load them
+    championship_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+    runner_up_count = db.Column(
+        db.Integer, nullable=False, default=0, server_default="0"
+    )
+
     team_id = db.Column(
         db.Integer, db.ForeignKey('team.id', ondelete="CASCADE")
     )
@@ -133,6 +164,9 @@ class User(BaseModel, UserMixin):
         "Stats", foreign_keys=[season_stats_id], cascade="all, delete"
     )
     
+    # Previous season stats are a cache of the aggregated SeasonPlayerStats 
+    # rows, combined with stats archived before those rows were kept
+
     # Used for lifetime stats
     prev_season_stats_id = db.Column(db.Integer, db.ForeignKey("stats.id"))
     prev_season_stats = db.relationship(
@@ -163,16 +197,10 @@ class User(BaseModel, UserMixin):
     )
 
     def get_disp_name(self) -> str:
-        s = ""
-        if hasattr(self, "championships") and self.championships is not None:
-            for c in self.championships:
-                s += "🥇 "
-
-        if hasattr(self, "second_places") and self.second_places is not None:
-            for c in self.second_places:
-                s += "🥈 "
-
-        return s + self.name
+        return (
+            "🥇 " * (self.championship_count or 0) 
+            + "🥈 " * (self.runner_up_count or 0) + self.name
+        )
 
     @hybrid_method
     def indv_stat(self, stat_type: str, stat_period: str, 
@@ -260,18 +288,120 @@ class User(BaseModel, UserMixin):
         return f"User('{self.name}', '{self.email}')"
 
 
+class IndvStatJoin:
+    """Builds :py:meth:`User.indv_stat` expressions from joined stat rows.
+
+    The hybrid ``indv_stat`` expression runs a correlated subquery with an 
+    ``OR`` over both stat foreign keys for every user, which can't use the 
+    stats primary key index. This joins the stat rows of the two periods 
+    once with LEFT JOINs and computes the stat inline, so any number of 
+    stat expressions in a query share the same joins. Results are the same 
+    as the hybrid expression, including NULL for users without stats.
+
+    Example:
+
+    .. code-block:: python
+
+        stats = IndvStatJoin("season_stats", "prev_season_stats")
+        users = stats.join(User.query) \\
+            .filter(stats.stat("game_count") >= 5) \\
+            .order_by(stats.stat("points", div_by_games=True).desc())
+
+    Args:
+        stat_period (str): Name of the first stat period on the user.
+        stat_period_2 (Optional[str]): Name of the optional second stat 
+            period on the user.
+    """
+
+    def __init__(self, stat_period: str, 
+                 stat_period_2: Optional[str] = None) -> None:
+        self.stat_period = stat_period
+        self.stat_period_2 = stat_period_2
+
+        self.period_1 = aliased(Stats, name=stat_period)
+        self.period_2 = (
+            aliased(Stats, name=stat_period_2) 
+            if stat_period_2 is not None else None
+        )
+
+    def join(self, query: Query) -> Query:
+        """Adds the LEFT JOINs of the period stat rows to a user query."""
+
+        query = query.outerjoin(
+            self.period_1, 
+            self.period_1.id == getattr(User, self.stat_period + "_id")
+        )
+
+        if self.period_2 is not None:
+            query = query.outerjoin(
+                self.period_2, 
+                self.period_2.id == getattr(User, self.stat_period_2 + "_id")
+            )
+
+        return query
+
+    def _combine(self, stat_type: str, combine_max: bool) -> ColumnElement:
+        val_1 = getattr(self.period_1, stat_type)
+        if self.period_2 is None:
+            return val_1
+
+        val_2 = getattr(self.period_2, stat_type)
+        missing_1 = self.period_1.id.is_(None)
+        missing_2 = self.period_2.id.is_(None)
+
+        if combine_max:
+            combined = case((val_1 >= val_2, val_1), else_=val_2)
+        else:
+            combined = val_1 + val_2
+
+        # Like the aggregate in the subquery, missing rows are skipped and 
+        # the result is NULL only when both rows are missing
+        return case(
+            (and_(missing_1, missing_2), None), 
+            (missing_1, val_2), 
+            (missing_2, val_1), 
+            else_=combined
+        )
+
+    def stat(self, stat_type: str, combine_max: bool = False, 
+             div_by_games: bool = False) -> ColumnElement:
+        """Returns the stat expression for the joined periods.
+        
+        Args:
+            stat_type (str): Stat key or ``game_count``.
+            combine_max (bool): Take the max of the periods instead of the 
+                sum.
+            div_by_games (bool): Divide the stat by the summed game count.
+        
+        Returns:
+            ColumnElement: Stat expression.
+        """
+
+        stat = self._combine(stat_type, combine_max)
+        if div_by_games is False:
+            return stat
+
+        games = self._combine("game_count", False)
+        return cast(stat, db.Float) / cast(func.nullif(games, 0), db.Float)
+
+
 class Game(BaseModel):
     id = db.Column(db.Integer, primary_key=True)
     
     team_1_score = db.Column(db.Integer, nullable=False)
     team_2_score = db.Column(db.Integer, nullable=False)
     
-    player_stats = db.relationship("Stats", cascade="all, delete")
+    player_stats = db.relationship(
+        "Stats", cascade="all, delete", order_by="Stats.id"
+    )
 
-    picture_file = db.Column(db.String(20))
+    # Content hash named picture, shared by games with identical uploads
+    picture_file = db.Column(db.String(20), index=True)
+    # Sizes and formats the picture is saved in, see recLeague.games.scorecards
+    picture_manifest = db.Column(db.JSON(none_as_null=True))
     comment = db.Column(db.String(120), unique=False, nullable=True)
     date_posted = db.Column(
-        db.DateTime, nullable=False, default=datetime.utcnow
+        db.DateTime, nullable=False, default=datetime.utcnow, index=True
     )
 
     verified = db.Column(
@@ -279,9 +409,13 @@ class Game(BaseModel):
     )
     
     players = db.relationship(
-        "User", secondary=player_game_table, backref="games"
+        "User", secondary=player_game_table, 
+        order_by=player_game_table.c.position, backref="games"
+    )
+    teams = db.relationship(
+        "Team", secondary=team_game_table, 
+        order_by=team_game_table.c.position, backref="games"
     )
-    teams = db.relationship("Team", secondary=team_game_table, backref="games")
     is_sub = db.Column(
         db.PickleType, 
         default=[False] * (NUM_TEAM_PLAYERS * 2)
@@ -310,6 +444,7 @@ class Team(BaseModel):
     # Team stats
     wins = db.Column(db.Integer, nullable=False, default=0)
     losses = db.Column(db.Integer, nullable=False, default=0)
+    games_played = db.Column(db.Integer, nullable=False, default=0)
 
     div_wins = db.Column(db.Integer, nullable=False, default=0)
     div_losses = db.Column(db.Integer, nullable=False, default=0)
@@ -330,6 +465,50 @@ class Division(BaseModel):
         return f"Division: {self.name}"
 
 
+class HeadToHead(BaseModel):
+    """Precomputed series record between two teams over verified games.
+
+    There is one row for each pair of teams who have played, with the team
+    of the lower ID as team 1. Rows are maintained when games are verified,
+    edited or deleted, see :py:func:`calculate_head_to_head
+    <recLeague.games.utils.calculate_head_to_head>`.
+
+    Attributes:
+        team_1_id (Mapped[int]): ID of the team with the lower ID.
+        team_2_id (Mapped[int]): ID of the team with the higher ID.
+        games (Mapped[int]): Number of verified games between the teams.
+        team_1_wins (Mapped[int]): Games won by team 1.
+        team_2_wins (Mapped[int]): Games won by team 2.
+        last_game_id (Mapped[int]): ID of the latest game between the teams.
+        last_team_1_score (Mapped[int]): Score of team 1 in the latest game.
+        last_team_2_score (Mapped[int]): Score of team 2 in the latest game.
+    """
+    __tablename__ = 'head_to_head'
+
+    team_1_id = db.Column(
+        db.Integer, db.ForeignKey('team.id', ondelete="CASCADE"),
+        primary_key=True
+    )
+    team_2_id = db.Column(
+        db.Integer, db.ForeignKey('team.id', ondelete="CASCADE"),
+        primary_key=True
+    )
+
+    games = db.Column(db.Integer, nullable=False, default=0)
+    team_1_wins = db.Column(db.Integer, nullable=False, default=0)
+    team_2_wins = db.Column(db.Integer, nullable=False, default=0)
+
+    last_game_id = db.Column(
+        db.Integer, db.ForeignKey('game.id', ondelete="SET NULL")
+    )
+    last_team_1_score = db.Column(db.Integer, nullable=False, default=0)
+    last_team_2_score = db.Column(db.Integer, nullable=False, default=0)
+
+    def __repr__(self):
+        return (f"HeadToHead({self.team_1_id}, {self.team_2_id}, "
+                f"{self.team_1_wins}-{self.team_2_wins})")
+
+
 class Season(BaseModel):
     """Database object representing seasons.
     
@@ -416,6 +595,197 @@ class ArchivedSeason(BaseModel):
         return "Season name: {}".format(self.name)
 
 
+class SeasonPlayerStats(BaseModel):
+    """Stats of a player in an archived season.
+
+    Rows are written in bulk when the season is archived. Aggregating them 
+    by user gives the lifetime (sum), best season (max) and best game (max 
+    of the ``high_`` columns) stats, which are cached on the previous season 
+    stats of :py:class:`User`.
+
+    Attributes:
+        archived_season_id (Mapped[int]): ID of the archived season.
+        user_id (Mapped[int]): ID of the player.
+        game_count (Mapped[int]): Verified games played in the season.
+        high_game_count (Mapped[int]): Game count of the best game stats, 
+            1 if the player played a game.
+
+    Season totals of every stat category are kept in columns named by the 
+    stat key, and the best single game of each in columns prefixed with 
+    ``high_``.
+    """
+    __tablename__ = 'season_player_stats'
+    __table_args__ = (
+        # Aggregates and season lists of a player read rows by user
+        db.Index(
+            'ix_season_player_stats_user', 'user_id', 'archived_season_id'
+        ),
+    )
+
+    archived_season_id = db.Column(
+        db.Integer, db.ForeignKey('archived_season.id', ondelete="CASCADE"), 
+        primary_key=True
+    )
+    user_id = db.Column(
+        db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), 
+        primary_key=True
+    )
+
+    game_count = db.Column(db.Integer, nullable=False, default=0)
+    high_game_count = db.Column(db.Integer, nullable=False, default=0)
+
+    archived_season = db.relationship(
+        "ArchivedSeason", 
+        backref=db.backref(
+            "player_stats", cascade="all, delete-orphan", 
+            passive_deletes=True
+        )
+    )
+    user = db.relationship(
+        "User", 
+        backref=db.backref(
+            "season_player_stats", cascade="all, delete-orphan", 
+            passive_deletes=True
+        )
+    )
+
+    def get_stats(self) -> list[int]:
+        return [getattr(self, stat) for stat in STAT_CATEGORY_KEYS]
+
+    def get_high_stats(self) -> list[int]:
+        return [getattr(self, "high_" + stat) for stat in STAT_CATEGORY_KEYS]
+
+    def __repr__(self):
+        return (f"SeasonPlayerStats({self.archived_season_id}, "
+                f"{self.user_id})")
+
+
+init_stats(SeasonPlayerStats)
+init_stats(SeasonPlayerStats, "high_")
+
+
+class LeaderboardEntry(BaseModel):
+    """Precomputed leaderboard value and rank of a user.
+    
+    Entries are rebuilt whenever season stats are recalculated, so pages of 
+    the leaderboard are read by position instead of sorting users on every 
+    request.
+
+    Attributes:
+        stat_key (Mapped[str]): Key of the stat, either ``game_count`` or one 
+            of the stat category keys.
+        stat_period (Mapped[str]): Name of the leaderboard period.
+        user_id (Mapped[int]): ID of the user.
+        value (Mapped[float]): Value of the stat for the period.
+        rank (Mapped[int]): Dense rank of the value, tied values share a rank.
+        position (Mapped[int]): Unique 1-based place on the leaderboard, used 
+            for paging.
+    """
+    __tablename__ = 'leaderboard_entry'
+    __table_args__ = (
+        db.Index(
+            'ix_leaderboard_entry_position', 
+            'stat_key', 'stat_period', 'position'
+        ),
+        # Finds the entries of a value range when a few players change
+        db.Index(
+            'ix_leaderboard_entry_value', 'stat_key', 'stat_period', 'value'
+        ),
+    )
+
+    stat_key = db.Column(db.String(30), primary_key=True)
+    stat_period = db.Column(db.String(30), primary_key=True)
+    user_id = db.Column(
+        db.Integer, db.ForeignKey('user.id', ondelete="CASCADE"), 
+        primary_key=True
+    )
+
+    value = db.Column(db.Float, nullable=False)
+    rank = db.Column(db.Integer, nullable=False)
+    position = db.Column(db.Integer, nullable=False)
+
+    user = db.relationship(
+        "User", 
+        backref=db.backref(
+            "leaderboard_entries", cascade="all, delete-orphan"
+        )
+    )
+
+    def __repr__(self):
+        return (f"LeaderboardEntry('{self.stat_key}', '{self.stat_period}', "
+                f"{self.user_id}, {self.rank})")
+
+
+class LeagueVersion(BaseModel):
+    """Counter of writes to league data.
+
+    The version is bumped whenever league data is written, so cached values 
+    keyed by the version are never served after the data changes. See 
+    :py:mod:`recLeague.cache`.
+
+    Attributes:
+        id (Mapped[int]): Unique ID of table.
+        version (Mapped[int]): Monotonically increasing version.
+    """
+    __tablename__ = 'league_version'
+
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+
+
+class SeasonArchiveJob(BaseModel):
+    """Checkpoint of a season being archived in the background.
+
+    The job is run by :py:mod:`recLeague.admin.archive`, one phase at a time.
+    Each phase commits together with the ``phase`` of the next one, so a job
+    interrupted by a worker restart resumes at the phase it was in.
+
+    Attributes:
+        id (Mapped[int]): Unique ID of table.
+        phase (Mapped[str]): Phase to run next, ``done`` once finished.
+        champion_team_id (Mapped[Optional[int]]): ID of the champion team,
+            ``None`` if the season has no games to archive.
+        runner_up_team_id (Mapped[Optional[int]]): ID of the runner-up team.
+        summary (Mapped[Optional[str]]): Summary of the archived season.
+        message (Mapped[Optional[str]]): Last progress message.
+        error (Mapped[Optional[str]]): Error that stopped the job.
+        worker (Mapped[Optional[str]]): Host and process running the job.
+        lease_expires (Mapped[Optional[datetime]]): Time the worker's claim
+            on the job expires, after which another worker may resume it.
+        date_created (Mapped[datetime]): Time the job was started.
+        date_finished (Mapped[Optional[datetime]]): Time the job finished.
+    """
+    __tablename__ = 'season_archive_job'
+
+    id = db.Column(db.Integer, primary_key=True)
+
+    phase = db.Column(db.String(20), nullable=False, default="archive")
+
+    # Team tables are recreated by the job, so no foreign keys
+    champion_team_id = db.Column(db.Integer)
+    runner_up_team_id = db.Column(db.Integer)
+    summary = db.Column(db.Text)
+
+    message = db.Column(db.String(200))
+    error = db.Column(db.Text)
+
+    worker = db.Column(db.String(100))
+    lease_expires = db.Column(db.DateTime)
+
+    date_created = db.Column(
+        db.DateTime, nullable=False, default=datetime.utcnow
+    )
+    date_finished = db.Column(db.DateTime)
+
+    def is_finished(self) -> bool:
+        """Checks if the season has been fully archived.
+        """
+        return self.phase == "done"
+
+    def __repr__(self):
+        return f"SeasonArchiveJob({self.id}, '{self.phase}')"
+
+
 class Settings(BaseModel):
     id = db.Column(db.Integer, primary_key=True)
 
@@ -0,0 +1,590 @@
+from __future__ import annotations
+from dataclasses import dataclass
+from typing import Iterable, Iterator, Optional, Sequence
+
+import numpy as np
+from flask_sqlalchemy.pagination import Pagination
+from sqlalchemy import and_, func, or_
+from sqlalchemy.orm import Query, joinedload, selectinload
+from sqlalchemy.sql import ColumnElement, Select
+
+from recLeague import db
+from recLeague.models import (
+    User, Stats, Game, Team, ArchivedSeason, SeasonPlayerStats, 
+    LeaderboardEntry, player_game_table
+)
+from recLeague.config import (
+    STAT_CATEGORY_KEYS, MIN_SEASON_AVERAGE_GAMES, MIN_LIFETIME_AVERAGE_GAMES
+)
+
+
+STAT_COLUMNS: list[str] = ["game_count"] + STAT_CATEGORY_KEYS
+""" Columns of packed stat arrays.
+
+    Game count is the first column followed by the stat categories, so a
+    single game stat line has a game count of 1.
+"""
+
+# Leaderboard stat types
+board_stats = {
+    "Game": {
+        "description": "Best stats in a single game.",
+        "period_1": "season_high_stats",
+        "period_2": "prev_season_high_stats",
+        "combine_max": True
+    },
+    "Current Season": {
+        "description": "Best stats in the current season only.",
+        "period_1": "season_stats"
+    },
+    "Season": {
+        "description": "Best stats in a single season.",
+        "period_1": "season_stats",
+        "period_2": "prev_season_best_stats",
+        "combine_max": True
+    },
+    "Lifetime": {
+        "description": "Best stats for all seasons combined.",
+        "period_1": "season_stats",
+        "period_2": "prev_season_stats"
+    },
+    "Current Season Average": {
+        "description": f"Average game stats in the current season only. \
+        Must have played over {MIN_SEASON_AVERAGE_GAMES} games.",
+        "period_1": "season_stats",
+        "min_games": MIN_SEASON_AVERAGE_GAMES,
+        "div_by_games": True
+    },
+    "Lifetime Average": {
+        "description": f"Average game stats for all seasons combined. \
+        Must have played over {MIN_LIFETIME_AVERAGE_GAMES} games.",
+        "period_1": "season_stats",
+        "period_2": "prev_season_stats",
+        "min_games": MIN_LIFETIME_AVERAGE_GAMES,
+        "div_by_games": True
+    }
+}
+
+
+@dataclass
+class StatAggregate:
+    """Aggregates of packed stat arrays.
+
+    Attributes:
+        sums: Sum of each column in :py:data:`STAT_COLUMNS` order.
+        maxima: Maximum of each column in :py:data:`STAT_COLUMNS` order.
+        averages: Stat categories divided by the summed game count, or 0
+            when there are no games.
+        game_count: Summed game count.
+    """
+    sums: np.ndarray
+    maxima: np.ndarray
+    averages: np.ndarray
+    game_count: np.ndarray
+
+
+def aggregate_stats(lines: np.ndarray) -> StatAggregate:
+    """Aggregates packed stat arrays in one vectorized call.
+
+    The second to last axis is reduced, so a ``games x columns`` array gives
+    the totals of one player and a ``users x periods x columns`` array gives
+    the combined periods of every user.
+
+    Args:
+        lines (np.ndarray): Packed stats with :py:data:`STAT_COLUMNS` as the
+            last axis.
+
+    Returns:
+        StatAggregate: Aggregated stats.
+    """
+
+    sums = lines.sum(axis=-2)
+    maxima = lines.max(axis=-2, initial=0)
+    game_count = sums[..., 0]
+
+    games = game_count[..., np.newaxis]
+    averages = np.divide(
+        sums[..., 1:], games, out=np.zeros(sums[..., 1:].shape),
+        where=(games > 0)
+    )
+
+    return StatAggregate(sums, maxima, averages, game_count)
+
+
+def pack_stats(stats: Sequence[Optional[Stats]]) -> np.ndarray:
+    """Packs stat objects into a ``len(stats) x columns`` array.
+
+    Args:
+        stats (Sequence[Optional[Stats]]): Stats to pack. None is packed as
+            zeros.
+
+    Returns:
+        np.ndarray: Packed stats.
+    """
+
+    packed = np.zeros((len(stats), len(STAT_COLUMNS)), dtype=np.int64)
+    for i, s in enumerate(stats):
+        if s is not None:
+            packed[i] = [getattr(s, key) for key in STAT_COLUMNS]
+
+    return packed
+
+
+def unpack_stats(values: np.ndarray, stats: Stats) -> None:
+    """Sets a stat object from a packed row.
+
+    Args:
+        values (np.ndarray): Packed stats in :py:data:`STAT_COLUMNS` order.
+        stats (Stats): Stat object to set.
+    """
+
+    values = values.tolist()
+    stats.set_stats(values[1:], values[0])
+
+
+def stat_lines_query(player_id: Optional[int] = None) -> Select:
+    """Returns a query for every verified game stat line with the ID of the
+    player it belongs to.
+
+    Rows are the player ID followed by the :py:data:`STAT_COLUMNS`. Stat
+    lines are matched to players by their order in the game.
+
+    Args:
+        player_id (Optional[int]): If given, only the lines of this player 
+            are included. Only the player's games are numbered, so the 
+            query doesn't read the rest of the season.
+    """
+
+    lines = db.select(
+        Stats,
+        (func.row_number().over(
+            partition_by=Stats.game_id, order_by=Stats.id
+        ) - 1).label("position")
+    ).join(Game, Game.id == Stats.game_id).where(Game.verified)
+    if player_id is not None:
+        lines = lines.where(Stats.game_id.in_(
+            db.select(player_game_table.c.game_id)
+            .where(player_game_table.c.player_id == player_id)
+        ))
+    lines = lines.subquery()
+
+    query = db.select(
+        player_game_table.c.player_id,
+        *[lines.c[key] for key in STAT_COLUMNS]
+    ).join(lines, and_(
+        lines.c.game_id == player_game_table.c.game_id,
+        lines.c.position == player_game_table.c.position
+    ))
+    if player_id is not None:
+        query = query.where(player_game_table.c.player_id == player_id)
+
+    return query
+
+
+def load_player_stat_lines(player: User) -> np.ndarray:
+    """Loads all verified game stat lines of a player with one query.
+
+    Args:
+        player (User): Player to load stat lines.
+
+    Returns:
+        np.ndarray: ``games x columns`` array of stat lines.
+    """
+
+    rows = db.session.execute(stat_lines_query(player.id)).all()
+
+    lines = np.zeros((len(rows), len(STAT_COLUMNS)), dtype=np.int64)
+    if len(rows) > 0:
+        lines[:] = np.array(rows, dtype=np.int64)[:, 1:]
+
+    return lines
+
+
+def season_stats_aggregate(combine: str = "sum", 
+                           prefix: str = "") -> Select:
+    """Returns a query aggregating the archived season stats of every player.
+
+    Rows are the user ID followed by the :py:data:`STAT_COLUMNS`, grouped by 
+    user with the user index of :py:class:`SeasonPlayerStats 
+    <recLeague.models.SeasonPlayerStats>`. Add a ``where`` on the user ID 
+    to aggregate a single player.
+
+    * Lifetime stats: ``combine="sum"``.
+    * Best season stats: ``combine="max"``.
+    * Best game stats: ``combine="max", prefix="high_"``.
+
+    Args:
+        combine (str): ``sum`` or ``max`` of the seasons.
+        prefix (str): ``high_`` to aggregate the best games of the seasons.
+
+    Returns:
+        Select: Aggregate query.
+    """
+
+    aggregate = func.sum if combine == "sum" else func.max
+    return db.select(
+        SeasonPlayerStats.user_id, 
+        *[
+            aggregate(getattr(SeasonPlayerStats, prefix + key)).label(key) 
+            for key in STAT_COLUMNS
+        ]
+    ).group_by(SeasonPlayerStats.user_id)
+
+
+def get_player_season_stats(
+        player: User) -> list[tuple[ArchivedSeason, SeasonPlayerStats]]:
+    """Returns the stats of a player in every archived season they played, 
+    most recent season first.
+
+    Args:
+        player (User): Player to get season stats.
+
+    Returns:
+        list[tuple[ArchivedSeason, SeasonPlayerStats]]: Archived seasons with 
+        the stats of the player.
+    """
+
+    return db.session.execute(
+        db.select(ArchivedSeason, SeasonPlayerStats)
+        .join(
+            SeasonPlayerStats, 
+            SeasonPlayerStats.archived_season_id == ArchivedSeason.id
+        )
+        .where(SeasonPlayerStats.user_id == player.id)
+        .order_by(ArchivedSeason.date_end.desc(), ArchivedSeason.id.desc())
+    ).tuples().all()
+
+
+def get_board_stat_values(users: Sequence[User], board_stat: dict,
+                          stat_key: str) -> np.ndarray:
+    """Returns the leaderboard value of a stat for users.
+
+    Matches :py:meth:`User.indv_stat <recLeague.models.User.indv_stat>` for
+    the board stat, but combines the periods of all users in one
+    vectorized call.
+
+    Args:
+        users (Sequence[User]): Users to get values.
+        board_stat (dict): Entry of :py:data:`board_stats`.
+        stat_key (str): Key of stat in :py:data:`STAT_COLUMNS`.
+
+    Returns:
+        np.ndarray: Stat value for each user.
+    """
+
+    periods = [board_stat["period_1"]]
+    if board_stat.get("period_2") is not None:
+        periods.append(board_stat["period_2"])
+
+    packed = np.stack([
+        pack_stats([getattr(u, period) for u in users]) for period in periods
+    ], axis=1)
+    agg = aggregate_stats(packed)
+
+    values = agg.maxima if board_stat.get("combine_max", False) else agg.sums
+    col = STAT_COLUMNS.index(stat_key)
+
+    if board_stat.get("div_by_games", False):
+        return np.divide(
+            values[:, col], values[:, 0], out=np.zeros(len(users)),
+            where=(values[:, 0] > 0)
+        )
+
+    return values[:, col]
+
+
+def get_standings() -> dict[int, list[tuple[Team, int]]]:
+    """Returns the league and division standings with one query.
+
+    Places are ranked in SQL with ``RANK()`` windows. League places are 
+    ranked by wins then games played, and division places are partitioned 
+    by division and ranked by division wins first. Teams with the same 
+    ranked record share a place.
+
+    Returns:
+        dict[int, list[tuple[Team, int]]]: Teams in standings order with 
+        their place, keyed by division ID. Key 0 is the league standings.
+    """
+
+    league_order = (
+        Team.wins.desc(), Team.games_played.desc(), Team.score_diff.desc()
+    )
+    league_place = func.rank().over(
+        order_by=(Team.wins.desc(), Team.games_played.desc())
+    )
+    division_place = func.rank().over(
+        partition_by=Team.division_id, 
+        order_by=(
+            Team.div_wins.desc(), Team.wins.desc(), Team.games_played.desc()
+        )
+    )
+
+    rows = db.session.execute(
+        db.select(Team, league_place, division_place).order_by(*league_order)
+    ).all()
+
+    standings = {0: [(team, place) for team, place, _ in rows]}
+    for team, _, place in sorted(rows, key=lambda r: (r[2], -r[0].score_diff)):
+        standings.setdefault(team.division_id, []).append((team, place))
+
+    return standings
+
+
+def _leaderboard_users(query: Query) -> Query:
+    # The root admin and guest players are never listed
+    return query.filter(User.id != 1, User.name != "Guest Player")
+
+
+def _board_values(users: Sequence[User]) \
+        -> Iterator[tuple[str, str, list[User], np.ndarray]]:
+    """Yields the period, stat key, listed users and their values of every 
+    leaderboard.
+    """
+
+    for stat_period, board_stat in board_stats.items():
+        # Games played over the periods decides if a player is listed
+        period_games = get_board_stat_values(users, {
+            "period_1": board_stat["period_1"], 
+            "period_2": board_stat.get("period_2")
+        }, "game_count")
+        listed = np.flatnonzero(
+            period_games >= board_stat.get("min_games", 1)
+        )
+        listed_users = [users[i] for i in listed]
+
+        for stat_key in STAT_COLUMNS:
+            values = get_board_stat_values(listed_users, board_stat, stat_key)
+            yield stat_period, stat_key, listed_users, values
+
+
+def refresh_leaderboard() -> None:
+    """Rebuilds the :py:class:`LeaderboardEntry 
+    <recLeague.models.LeaderboardEntry>` table.
+
+    Values of every stat and period are computed for all players at once, 
+    ranked and written back with one bulk insert. Players are only listed 
+    on a period when they have played the minimum number of games for it.
+
+    This reads every user, so it is used when all stats change, like 
+    rebuilding or rolling over the season. Use :py:func:`update_leaderboard` 
+    when only a few players changed.
+    """
+
+    periods = ["season_stats", "season_high_stats", "prev_season_stats", 
+               "prev_season_best_stats", "prev_season_high_stats"]
+    users = _leaderboard_users(User.query) \
+        .options(*[selectinload(getattr(User, p)) for p in periods]) \
+        .order_by(User.id).all()
+
+    rows = []
+    for stat_period, stat_key, listed_users, values in _board_values(users):
+        user_ids = np.array([u.id for u in listed_users], dtype=np.int64)
+
+        # Highest value first, ties ordered by user ID
+        order = np.lexsort((user_ids, -values))
+        ranks = np.unique(-values, return_inverse=True)[1] + 1
+
+        for position, i in enumerate(order.tolist()):
+            rows.append({
+                "stat_key": stat_key, 
+                "stat_period": stat_period, 
+                "user_id": listed_users[i].id, 
+                "value": float(values[i]), 
+                "rank": int(ranks[i]), 
+                "position": position + 1
+            })
+
+    db.session.execute(db.delete(LeaderboardEntry))
+    if len(rows) > 0:
+        db.session.execute(db.insert(LeaderboardEntry), rows)
+
+
+def _board_where(board: tuple[str, str]) -> ColumnElement:
+    entry = LeaderboardEntry.__table__
+    return and_(
+        entry.c.stat_key == board[0], entry.c.stat_period == board[1]
+    )
+
+
+def _lowest_rank(board: tuple[str, str], value: float) -> int:
+    """Returns the rank of the lowest entry of a board with at least the 
+    value, 0 if there is none.
+    """
+
+    entry = LeaderboardEntry.__table__
+    return db.session.scalar(
+        db.select(entry.c.rank)
+        .where(_board_where(board), entry.c.value >= value)
+        .order_by(entry.c.value).limit(1)
+    ) or 0
+
+
+def _rerank_board(board: tuple[str, str], low: float, high: float, 
+                  rank_before: int, added: int) -> None:
+    """Re-ranks the entries of a board after entries with values between 
+    ``low`` and ``high`` changed.
+
+    Entries above ``high`` keep their place. Entries between the values are 
+    ranked with windows, offset by the lowest entry above them, and entries 
+    below ``low`` are shifted by the change in ranks and entries above them.
+    """
+
+    entry = LeaderboardEntry.__table__
+    where = _board_where(board)
+
+    above = db.session.execute(
+        db.select(entry.c.rank, entry.c.position)
+        .where(where, entry.c.value > high)
+        .order_by(entry.c.value, entry.c.position.desc()).limit(1)
+    ).first()
+    rank_offset, position_offset = (0, 0) if above is None else above
+
+    ranked = db.select(
+        entry.c.user_id, 
+        (func.dense_rank().over(order_by=entry.c.value.desc()) 
+         + rank_offset).label("rank"), 
+        (func.row_number().over(
+            order_by=(entry.c.value.desc(), entry.c.user_id)
+        ) + position_offset).label("position")
+    ).where(where, entry.c.value.between(low, high)).subquery()
+
+    db.session.execute(
+        db.update(entry)
+        .values(rank=ranked.c.rank, position=ranked.c.position)
+        .where(
+            where, entry.c.user_id == ranked.c.user_id, 
+            or_(
+                entry.c.rank != ranked.c.rank, 
+                entry.c.position != ranked.c.position
+            )
+        )
+    )
+
+    rank_shift = _lowest_rank(board, low) - rank_before
+    if rank_shift != 0 or added != 0:
+        db.session.execute(
+            db.update(entry)
+            .where(where, entry.c.value < low)
+            .values(
+                rank=entry.c.rank + rank_shift, 
+                position=entry.c.position + added
+            )
+        )
+
+
+def update_leaderboard(players: Iterable[User]) -> None:
+    """Updates the leaderboard entries of a few players.
+
+    Values are only computed for the given players. On each board where one 
+    of their values changed, only the entries between the old and new 
+    values are ranked again, and entries below them are shifted if their 
+    rank or position moved. Ranks and positions match 
+    :py:func:`refresh_leaderboard`.
+
+    Args:
+        players (Iterable[User]): Players whose stats changed.
+    """
+
+    players = list(players)
+    listed = {p.id for p in players}
+    if len(listed) > 0:
+        listed = set(db.session.scalars(
+            _leaderboard_users(db.select(User.id))
+            .where(User.id.in_(listed))
+        ))
+    users = sorted(
+        (p for p in players if p.id in listed), key=lambda p: p.id
+    )
+    if len(users) == 0:
+        return
+
+    entry = LeaderboardEntry.__table__
+    old = {
+        (row.stat_key, row.stat_period, row.user_id): row.value 
+        for row in db.session.execute(
+            db.select(
+                entry.c.stat_key, entry.c.stat_period, entry.c.user_id, 
+                entry.c.value
+            ).where(entry.c.user_id.in_(listed))
+        )
+    }
+    new = {}
+    for stat_period, stat_key, listed_users, values in _board_values(users):
+        for user, value in zip(listed_users, values.tolist()):
+            new[(stat_key, stat_period, user.id)] = float(value)
+
+    removed = [key for key in old if old[key] != new.get(key)]
+    added = [key for key in new if new[key] != old.get(key)]
+
+    # Values moved on each board and the change in number of entries
+    changes: dict[tuple[str, str], list[float]] = {}
+    net_added: dict[tuple[str, str], int] = {}
+    for key in removed:
+        changes.setdefault(key[:2], []).append(old[key])
+        net_added[key[:2]] = net_added.get(key[:2], 0) - 1
+    for key in added:
+        changes.setdefault(key[:2], []).append(new[key])
+        net_added[key[:2]] = net_added.get(key[:2], 0) + 1
+    if len(changes) == 0:
+        return
+
+    ranks_before = {
+        board: _lowest_rank(board, min(values)) 
+        for board, values in changes.items()
+    }
+
+    if len(removed) > 0:
+        db.session.execute(
+            db.delete(entry).where(
+                entry.c.stat_key == db.bindparam("b_stat_key"), 
+                entry.c.stat_period == db.bindparam("b_stat_period"), 
+                entry.c.user_id == db.bindparam("b_user_id")
+            ), 
+            [
+                {"b_stat_key": k, "b_stat_period": p, "b_user_id": u} 
+                for k, p, u in removed
+            ]
+        )
+    if len(added) > 0:
+        db.session.execute(db.insert(entry), [
+            {
+                "stat_key": k, "stat_period": p, "user_id": u, 
+                "value": new[(k, p, u)], "rank": 0, "position": 0
+            } 
+            for k, p, u in added
+        ])
+
+    for board, values in changes.items():
+        _rerank_board(
+            board, min(values), max(values), ranks_before[board], 
+            net_added[board]
+        )
+
+
+class LeaderboardPagination(Pagination):
+    """Pagination of leaderboard entries for a stat and period.
+
+    Pages are read as a range of leaderboard positions from the position 
+    index instead of with an OFFSET.
+
+    Takes ``stat_key`` and ``stat_period`` arguments in addition to the 
+    Flask-SQLAlchemy ``Pagination`` arguments.
+    """
+
+    def _entries(self):
+        return LeaderboardEntry.query.filter_by(
+            stat_key=self._query_args["stat_key"], 
+            stat_period=self._query_args["stat_period"]
+        )
+
+    def _query_items(self) -> list[LeaderboardEntry]:
+        return self._entries() \
+            .filter(LeaderboardEntry.position.between(
+                self._query_offset + 1, self._query_offset + self.per_page
+            )) \
+            .options(joinedload(LeaderboardEntry.user)) \
+            .order_by(LeaderboardEntry.position).all()
+
+    def _query_count(self) -> int:
+        return self._entries() \
+            .with_entities(func.max(LeaderboardEntry.position)).scalar() or 0
@@ -4,10 +4,15 @@ from flask import (
 )
 from flask.typing import ResponseReturnValue
 from flask_login import current_user
+from sqlalchemy.orm import selectinload
 
 from recLeague import db
-from recLeague.models import Team, Season
+from recLeague.models import Team, Game, HeadToHead, team_game_table
 from recLeague.teams.forms import TeamCreateForm, TeamJoinForm
+from recLeague.games.utils import game_card_options, head_to_head_games
+from recLeague.main.utils import get_current_season
+from recLeague.users.utils import forget_user
+from recLeague.teams.utils import get_team_choices, get_roster_bundle
 from recLeague.config import (
     NUM_TEAM_PLAYERS
 )
@@ -42,12 +47,49 @@ def _get_team_players(team_id: int) -> ResponseReturnValue:
         return ('', 400)
 
 
+@teams.route("/team-rosters")
+def _get_team_rosters() -> ResponseReturnValue:
+    """API route for getting the players of every full team at once.
+
+    The response has an ETag of the league version. When requested with the 
+    current version it can be cached by the browser indefinitely, since any 
+    roster change creates a new version.
+
+    Returns:
+        json: Object with fields version and teams, mapping team IDs to 
+        arrays of user IDs on the team.
+
+    :query int v: League version of the requested bundle.
+
+    :resheader Content-Type: application/json
+    :resheader ETag: League version of the bundle.
+
+    :statuscode 200: Roster bundle.
+    :statuscode 304: Bundle of the ETag is still current.
+    """
+
+    bundle = get_roster_bundle()
+    response = jsonify(bundle)
+    response.set_etag(f"rosters-{bundle['version']}")
+
+    response.cache_control.private = True
+    if request.args.get('v', type=int) == bundle["version"]:
+        response.cache_control.max_age = 31536000
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+
+    return response.make_conditional(request)
+
+
 @teams.route("/teams-latest-game-score")
 def _get_teams_latest_game_score() -> ResponseReturnValue:
     """API route gets latest game score between two teams.
     
     Returns:
-        json: Object with fields team_1 and team_2 set to the score.
+        json: Object with fields team_1 and team_2 set to the score, and 
+        record set to an object with fields team_1 and team_2 set to the 
+        number of verified games won.
 
     :query int team-1: ID of team 1.
     :query int team-2: ID of team 2.
@@ -63,21 +105,27 @@ def _get_teams_latest_game_score() -> ResponseReturnValue:
     team_2 = request.args.get('team-2', None, type=int)
 
     if team_1 is not None and team_2 is not None and team_1 != team_2:
-        t1 = Team.query.get_or_404(team_1)
-        t2 = Team.query.get_or_404(team_2)
-
-        # Search for team 2 in all of team 1's games
-        for game in t1.games:
-            if t2 in game.teams:
-                team_index = game.teams.index(t1)
-                scores = [game.team_1_score, game.team_2_score]
-                score = {
-                    "team_1": scores[team_index],
-                    "team_2": scores[1 - team_index]
-                }
-                return jsonify(score) 
-
-        return ('', 204)
+        # Latest game of any state, so unverified duplicates are found
+        latest = db.session.execute(
+            head_to_head_games(team_1, team_2).limit(1)
+        ).first()
+        if latest is None:
+            return ('', 204)
+
+        record = db.session.get(
+            HeadToHead, (min(team_1, team_2), max(team_1, team_2))
+        )
+        wins = [0, 0] if record is None \
+            else [record.team_1_wins, record.team_2_wins]
+        if team_1 > team_2:
+            wins.reverse()
+
+        score = {
+            "team_1": latest.team_1_score,
+            "team_2": latest.team_2_score,
+            "record": {"team_1": wins[0], "team_2": wins[1]}
+        }
+        return jsonify(score) 
 
     return ('', 400)
 
@@ -87,7 +135,7 @@ def create_team() -> ResponseReturnValue:
     """Route for creating a new team.
     """
 
-    if current_user.team is not None and current_user.is_admin is False:
+    if current_user.team_id is not None and current_user.is_admin is False:
         abort(403)
 
     form = TeamCreateForm()
@@ -96,9 +144,10 @@ def create_team() -> ResponseReturnValue:
         t = Team(name=form.team_name.data)
         # Add user to new team unless if admin is creating team
         if current_user.is_admin is False:
-            t.players.append(current_user)
+            t.players.append(current_user.get_user())
         db.session.add(t)
         db.session.commit()
+        forget_user(current_user.id)
         flash('Your team has been created!', 'success')
         if current_user.is_admin:
             return redirect(url_for('admin.teams')) 
@@ -118,24 +167,27 @@ def delete_team(team_id: int) -> ResponseReturnValue:
 
     team = Team.query.get_or_404(team_id)
     
-    season = Season.query.first()
+    season = get_current_season()
     # Player can't delete team when in season
     if (season is not None and season.is_active() 
             and current_user.is_admin is False):
         abort(403)
     # Player can't delete team if they don't have a team (they would 
     # be only a user then)
-    if current_user.team is None and current_user.is_admin is False:
+    if current_user.team_id is None and current_user.is_admin is False:
         abort(403)
     # Player can't delete another players team
-    if (current_user.team is not None and current_user.team.id != team_id 
+    if (current_user.team_id is not None and current_user.team_id != team_id 
             and current_user.is_admin is False):
         abort(403)
     # Admin can't delete team if the team has games
     if len(team.games) > 0:
         abort(403)
+    player_ids = [p.id for p in team.players]
     db.session.delete(team)
     db.session.commit()
+    for player_id in player_ids:
+        forget_user(player_id)
 
     flash('Team has been deleted!', 'success')
     
@@ -150,11 +202,11 @@ def leave_team() -> ResponseReturnValue:
     """Route for leaving a team.
     """
 
-    if current_user.team is None:
+    if current_user.team_id is None:
         flash('No team to leave.', 'warning')
         return redirect(url_for('main.home'))
 
-    season = Season.query.first()
+    season = get_current_season()
 
     # Delete team if we are the only one on it
     if ((season is None or season.is_active() is False) 
@@ -164,6 +216,7 @@ def leave_team() -> ResponseReturnValue:
 
     current_user.team = None
     db.session.commit()
+    forget_user(current_user.id)
 
     flash('You have left your team!', 'success')
     return redirect(url_for('main.home'))
@@ -176,11 +229,7 @@ def join_team() -> ResponseReturnValue:
 
     form = TeamJoinForm()
 
-    form.team.choices = [
-        (t.id, t.name) 
-        for t in Team.query.order_by('name') 
-        if len(t.players) < NUM_TEAM_PLAYERS
-    ] 
+    form.team.choices = get_team_choices(full=False)
 
     if form.validate_on_submit():
         t = Team.query.get(form.team.data)
@@ -188,8 +237,9 @@ def join_team() -> ResponseReturnValue:
         if (t is None 
                 or len(t.players) >= NUM_TEAM_PLAYERS):
             abort(403)
-        t.players.append(current_user)
+        t.players.append(current_user.get_user())
         db.session.commit()
+        forget_user(current_user.id)
         return redirect(url_for('main.home'))
 
     return render_template('team_join.html', title='Join Team', form=form)
@@ -203,6 +253,16 @@ def team(team_id: int) -> ResponseReturnValue:
         team_id (int): ID of team
     """
 
-    team = Team.query.get_or_404(team_id)
+    team = Team.query.options(selectinload(Team.players)).get_or_404(team_id)
+    page = request.args.get('page', 1, type=int)
+
+    games = Game.query \
+        .join(team_game_table, team_game_table.c.game_id == Game.id) \
+        .filter(team_game_table.c.team_id == team.id) \
+        .options(*game_card_options()) \
+        .order_by(Game.date_posted.desc(), Game.id.desc()) \
+        .paginate(page=page, per_page=20)
     
-    return render_template('team.html', team=team, highlight_stat=None)
+    return render_template(
+        'team.html', team=team, games=games, highlight_stat=None
+    )
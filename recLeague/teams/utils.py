@@ -0,0 +1,110 @@
+from __future__ import annotations
+
+from sqlalchemy import func
+
+from recLeague import db
+from recLeague.cache import cache, get_league_version
+from recLeague.models import User, Team
+from recLeague.config import NUM_TEAM_PLAYERS
+
+
+def _load_rosters() -> dict:
+    team_sizes = db.select(Team.id, Team.name, func.count(User.id)) \
+        .outerjoin(User, User.team_id == Team.id) \
+        .group_by(Team.id).order_by(Team.name)
+    guests = db.select(User.id).where(User.name == "Guest Player") \
+        .order_by(User.id)
+    players = db.select(User.id, User.name) \
+        .where(User.team_id.is_not(None)).order_by(User.name)
+    team_players = db.select(User.team_id, User.id) \
+        .where(User.team_id.is_not(None)).order_by(User.team_id, User.id)
+
+    rosters = {
+        "teams": [tuple(row) for row in db.session.execute(team_sizes)],
+        "guests": list(db.session.scalars(guests)),
+        "players": [tuple(row) for row in db.session.execute(players)],
+        "team_players": {}
+    }
+    for team_id, user_id in db.session.execute(team_players):
+        rosters["team_players"].setdefault(team_id, []).append(user_id)
+
+    return rosters
+
+
+def get_rosters() -> dict:
+    """Returns every team with its size, and the players that can be picked 
+    in games.
+
+    Team sizes are counted with one grouped query. The result is cached until 
+    league data changes, which includes any roster change.
+
+    Returns:
+        dict: ``teams`` as ``(id, name, size)`` ordered by name, ``guests`` 
+        as guest player IDs, ``players`` as ``(id, name)`` of players on a 
+        team ordered by name and ``team_players`` mapping team IDs to their 
+        player IDs.
+    """
+
+    return cache.get_or_set("rosters", _load_rosters)
+
+
+def get_team_choices(full: bool) -> list[tuple[int, str]]:
+    """Returns select field choices of teams.
+
+    Args:
+        full (bool): If True, returns teams with a full roster that can play 
+            games. Otherwise returns teams with room to join.
+
+    Returns:
+        list[tuple[int, str]]: Team ID and name ordered by name.
+    """
+
+    return [
+        (team_id, name) 
+        for team_id, name, size in get_rosters()["teams"] 
+        if (size >= NUM_TEAM_PLAYERS) == full
+    ]
+
+
+def get_player_choices() -> list[tuple[int, str]]:
+    """Returns select field choices of players that can play in games.
+
+    Guest players are listed first followed by players with a team.
+
+    Returns:
+        list[tuple[int, str]]: User ID and displayed name.
+    """
+
+    rosters = get_rosters()
+    guests = [
+        (user_id, "*Guest " + str(i+1)) 
+        for i, user_id in enumerate(rosters["guests"])
+    ]
+    return guests + rosters["players"]
+
+
+def get_roster_bundle() -> dict:
+    """Returns the player IDs of every team with a full roster.
+
+    Used by the game form to fill in the players of a selected team without 
+    a request for each team.
+
+    Returns:
+        dict: ``version`` as the league version the bundle was built from 
+        and ``teams`` mapping team IDs (as strings) to their player IDs.
+    """
+
+    rosters = get_rosters()
+    full_teams = {
+        team_id for team_id, _, size in rosters["teams"] 
+        if size >= NUM_TEAM_PLAYERS
+    }
+
+    return {
+        "version": get_league_version(),
+        "teams": {
+            str(team_id): player_ids 
+            for team_id, player_ids in rosters["team_players"].items() 
+            if team_id in full_teams
+        }
+    }
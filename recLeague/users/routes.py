@@ -6,11 +6,13 @@ from flask_login import login_user, current_user, logout_user
 from sqlalchemy import func
 
 from recLeague import db, bcrypt
-from recLeague.models import User, Settings
+from recLeague.models import User, Game, Settings, player_game_table
 from recLeague.users.forms import (
     RegistrationForm, LoginForm, RequestResetForm, ResetPasswordForm
 )
-from recLeague.users.utils import send_reset_email
+from recLeague.users.utils import send_reset_email, forget_user
+from recLeague.games.utils import game_card_options
+from recLeague.stats.utils import get_player_season_stats
 from recLeague.config import STAT_HIGHLIGHT, STAT_CATEGORY_KEYS, STAT_CATEGORY_NAMES
 
 users = Blueprint('users', __name__)
@@ -108,9 +110,20 @@ def account(user_id: int) -> ResponseReturnValue:
     """
 
     user = User.query.get_or_404(user_id)
+    page = request.args.get('page', 1, type=int)
+
+    games = Game.query \
+        .join(player_game_table, player_game_table.c.game_id == Game.id) \
+        .filter(player_game_table.c.player_id == user.id) \
+        .options(*game_card_options()) \
+        .order_by(Game.date_posted.desc(), Game.id.desc()) \
+        .paginate(page=page, per_page=20)
+
     return render_template(
-        'account.html', user=user, stat_names=STAT_CATEGORY_NAMES, 
-        stat_var_names=STAT_CATEGORY_KEYS, highlight_stat=STAT_HIGHLIGHT
+        'account.html', user=user, games=games, 
+        season_stats=get_player_season_stats(user), 
+        stat_names=STAT_CATEGORY_NAMES, stat_var_names=STAT_CATEGORY_KEYS, 
+        highlight_stat=STAT_HIGHLIGHT
     )
 
 
@@ -131,6 +144,7 @@ def delete_user(user_id: int) -> ResponseReturnValue:
         abort(403)
     db.session.delete(user)
     db.session.commit()
+    forget_user(user_id)
 
     flash('User has been deleted!', 'success')
     return redirect(url_for('admin.users'))
@@ -190,6 +204,7 @@ def reset_token(token) -> ResponseReturnValue:
         ).decode('utf-8')
         user.password = hashed_password
         db.session.commit()
+        forget_user(user.id)
         flash(
             'Your password has been updated! You are now able to log in', 
             'success'
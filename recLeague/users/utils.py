@@ -1,8 +1,139 @@
+from __future__ import annotations
+from typing import Any, Optional
+
 from flask import url_for
+from flask_login import UserMixin
 from flask_mail import Message
 
-from recLeague import mail
-from recLeague.models import User
+from recLeague import db, mail, login_manager
+from recLeague.cache import LRUCache
+from recLeague.models import (
+    User, user_championship_table, user_runner_up_table
+)
+
+
+user_cache = LRUCache(max_size=1024, ttl=30)
+""" Per-process cache of user snapshot values keyed by user ID.
+
+    The TTL is set from ``USER_CACHE_TTL`` in the Flask config.
+"""
+
+
+class UserSnapshot(UserMixin):
+    """Copy of the user columns read on most requests.
+
+    Flask-Login loads this instead of a :py:class:`User 
+    <recLeague.models.User>`, so most requests don't query the user. Reading 
+    any other attribute, such as a relationship or method, loads the full 
+    user once for the request and reads it from there. Setting an attribute 
+    sets it on the full user.
+
+    Use :py:meth:`get_user` where a database object is needed, like adding 
+    the user to a relationship.
+    """
+
+    columns = ("id", "name", "email", "is_admin", "is_banned", "team_id")
+
+    def __init__(self, values: dict, user: Optional[User] = None) -> None:
+        self.__dict__.update(values)
+        self.__dict__["_user"] = user
+
+    def get_user(self) -> User:
+        """Returns the full user, loading it on first use."""
+
+        if self.__dict__["_user"] is None:
+            self.__dict__["_user"] = db.session.get(User, self.id)
+        return self.__dict__["_user"]
+
+    def __getattr__(self, name: str) -> Any:
+        # Only called for attributes missing from the snapshot
+        if name.startswith("__"):
+            raise AttributeError(name)
+        return getattr(self.get_user(), name)
+
+    def __setattr__(self, name: str, value: Any) -> None:
+        setattr(self.get_user(), name, value)
+        if name in self.columns:
+            self.__dict__[name] = value
+
+
+@login_manager.user_loader
+def load_user(user_id: str) -> Optional[UserSnapshot]:
+    values = user_cache.get(user_id)
+    if values is not None:
+        return UserSnapshot(values)
+
+    user = db.session.get(User, int(user_id))
+    if user is None:
+        return None
+
+    values = {c: getattr(user, c) for c in UserSnapshot.columns}
+    user_cache.set(user_id, values)
+    return UserSnapshot(values, user)
+
+
+allowed_cache = LRUCache(max_size=1, ttl=30)
+""" Per-process cache of the IDs of users who can log in, with the highest 
+    ID of any user.
+
+    The TTL is set from ``USER_CACHE_TTL`` in the Flask config.
+"""
+
+
+def get_allowed_user_ids(user_id: Optional[str] = None) -> frozenset[str]:
+    """Returns the IDs of users who exist and are not banned as strings, 
+    like session user IDs.
+
+    The set is loaded with one query and then cached by the process. Deleted 
+    and banned users are left out, so their old cookies are rejected.
+
+    Args:
+        user_id (Optional[str]): ID about to be checked. If it is higher than 
+            the ID of every cached user, the set is loaded again, so users 
+            who signed up on another process are allowed right away.
+    """
+
+    checked_id = int(user_id) if user_id is not None \
+        and user_id.isdigit() else 0
+
+    allowed = allowed_cache.get("allowed")
+    if allowed is None or (
+            user_id not in allowed[0] and checked_id > allowed[1]):
+        rows = db.session.execute(db.select(User.id, User.is_banned)).all()
+        # The checked ID counts as seen, so the ID of a deleted user 
+        # doesn't load the set again on every check
+        allowed = (
+            frozenset(str(i) for i, is_banned in rows if not is_banned), 
+            max([checked_id] + [i for i, _ in rows])
+        )
+        allowed_cache.set("allowed", allowed)
+
+    return allowed[0]
+
+
+def forget_user(user_id: int) -> None:
+    """Removes a user from the user cache.
+    
+    Call after changing a user's ban or admin status, password or team, or 
+    deleting the user so the next request loads the new values. Other 
+    processes reload the user once their cached copy expires.
+
+    Args:
+        user_id (int): ID of user.
+    """
+
+    user_cache.delete(str(user_id))
+    allowed_cache.clear()
+
+
+def forget_all_users() -> None:
+    """Removes every user from the user cache.
+
+    Call after changes to many users, like removing every player from their 
+    team when the season is archived.
+    """
+
+    user_cache.clear()
 
 
 def send_reset_email(user: User) -> None:
@@ -25,3 +156,18 @@ If you did not make this request then simply ignore this email and no changes \
 will be made.
 '''
     mail.send(msg)
+
+
+def recount_medals() -> None:
+    """Recounts the championship and runner-up counts of every user from the 
+    archived seasons with one UPDATE.
+    """
+
+    def count(table):
+        return db.select(db.func.count()) \
+            .where(table.c.player_id == User.id).scalar_subquery()
+
+    db.session.execute(db.update(User).values(
+        championship_count=count(user_championship_table), 
+        runner_up_count=count(user_runner_up_table)
+    ))